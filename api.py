@@ -0,0 +1,147 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from utils.milvus_client import MilvusClient
+from utils.batching import BatchingInferenceServer
+from utils.hits import hit_to_dict
+from utils.metrics import metrics
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# Число потоков для CPU-задач (энкодер, QA-модель) и предел одновременно обрабатываемых запросов
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", "64"))
+# INFERENCE_WORKERS > 0 — энкодер и QA-модель работают в пуле процессов с закреплёнными ядрами
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0")) or None
+
+
+class QueryRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=1000)
+    k: int = Field(3, ge=1, le=50)
+
+
+class State:
+    milvus_client = None
+    executor = None
+    inference_server = None
+    pending = None
+
+
+state = State()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    print("Запуск API медицинского помощника...")
+    state.executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+    state.pending = asyncio.Semaphore(API_MAX_PENDING)
+    loop = asyncio.get_running_loop()
+    # Модели и коллекция загружаются в пуле, чтобы не блокировать цикл событий
+    state.milvus_client = await loop.run_in_executor(state.executor, MilvusClient)
+    collection = await loop.run_in_executor(state.executor, state.milvus_client.get_qa_collection)
+    await loop.run_in_executor(state.executor, state.milvus_client.create_index, collection)
+    if INFERENCE_WORKERS > 0:
+        await loop.run_in_executor(
+            state.executor, state.milvus_client.start_inference_pool, INFERENCE_WORKERS, INFERENCE_THREADS
+        )
+    if os.getenv("BATCHING_ENABLED", "0") == "1":
+        state.inference_server = BatchingInferenceServer(
+            state.milvus_client,
+            max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "16")),
+            max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "5")),
+            workers=API_WORKERS
+        ).start()
+    yield
+    if state.inference_server is not None:
+        state.inference_server.stop()
+    state.milvus_client.stop_inference_pool()
+    state.executor.shutdown(wait=False)
+    metrics.flush()
+
+
+app = FastAPI(title="Медицинский помощник API", lifespan=lifespan)
+
+
+async def run_limited(func, *args):
+    """Выполняет CPU-задачу в ограниченном пуле; при переполнении очереди отвечает 503"""
+    if state.pending.locked():
+        raise HTTPException(status_code=503, detail="Сервер перегружен, повторите запрос позже")
+    async with state.pending:
+        return await asyncio.get_running_loop().run_in_executor(state.executor, func, *args)
+
+
+@app.get("/health")
+async def health():
+    client = state.milvus_client
+    corpus_version = None
+    if client is not None:
+        # Версия корпуса может перечитать лексический индекс с диска — в пуле, не в цикле событий
+        corpus_version = await asyncio.get_running_loop().run_in_executor(state.executor, client.corpus_version)
+    return {
+        "status": "ok" if client is not None else "starting",
+        "collection": client.qa_collection_name if client is not None else None,
+        "corpus_version": corpus_version,
+    }
+
+
+@app.get("/stats")
+async def stats():
+    """Доля запросов по путям ответа (быстрый путь FAQ, кэш, QA-модель) и состояние кэшей"""
+    client = state.milvus_client
+    if client is None:
+        raise HTTPException(status_code=503, detail="Сервер запускается")
+    report = {
+        "answer_paths": client.faq.stats(),
+        "answer_cache": client.answer_cache.stats(),
+        "query_cache": client.query_cache.stats(),
+        "routing": dict(client.routing_stats),
+        "stages": metrics.snapshot(),
+    }
+    if state.inference_server is not None:
+        report["batching"] = state.inference_server.stats()
+    return report
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Задержки этапов конвейера и счётчики в текстовом формате Prometheus"""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def traced_retrieve(query, k):
+    with metrics.trace("search", query=query, k=k) as trace:
+        results = state.milvus_client.retrieve(query, k)
+        trace.update(output=[hit.id for hit in results])
+    return results
+
+
+@app.post("/search")
+async def search(request: QueryRequest):
+    results = await run_limited(traced_retrieve, request.query, request.k)
+    return {"results": [hit_to_dict(hit) for hit in results]}
+
+
+@app.post("/answer")
+async def answer(request: QueryRequest):
+    if state.inference_server is not None:
+        if state.pending.locked():
+            raise HTTPException(status_code=503, detail="Сервер перегружен, повторите запрос позже")
+        async with state.pending:
+            answer, results = await state.inference_server.search(request.query, request.k)
+    else:
+        answer, results = await run_limited(state.milvus_client.search_and_generate, request.query, request.k)
+    return {"answer": answer, "results": [hit_to_dict(hit) for hit in results]}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("API_HOST", "0.0.0.0"), port=int(os.getenv("API_PORT", "8000")))
@@ -1,7 +1,13 @@
+import os
 import streamlit as st
-from main import search
 import base64
 
+# RAG_API_URL — Streamlit работает тонким клиентом HTTP API (api.py), иначе модели грузятся в этом процессе
+if os.getenv("RAG_API_URL"):
+    from utils.api_client import search
+else:
+    from main import search
+
 # Настройка страницы
 st.set_page_config(
     page_title="Медицинский помощник",
@@ -0,0 +1,82 @@
+import json
+import time
+import argparse
+from dotenv import load_dotenv
+from utils.milvus_client import MilvusClient
+from utils.bulk_loader import iter_batches
+from utils.hits import hit_to_dict
+from utils.metrics import metrics
+
+load_dotenv()
+
+
+def iter_queries(file_path):
+    """
+    Потоковое чтение запросов: текстовый файл (запрос на строку) или JSONL с полем query/question.
+    Остальные поля JSONL (например, id) переносятся в результат.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                query = record.pop("query", None) or record.pop("question", None)
+                if query:
+                    yield query, record
+            else:
+                yield line, {}
+
+
+def answer_file(milvus_client, input_path, results_path, k=3, batch_size=256):
+    """
+    Отвечает на запросы файла пачками по batch_size и дописывает результаты в JSONL.
+    В памяти одновременно находится только одна пачка запросов и ответов.
+    """
+    stats = {"queries": 0, "batches": 0}
+    start = time.perf_counter()
+    with open(results_path, "w", encoding="utf-8") as output:
+        for batch in iter_batches(iter_queries(input_path), batch_size):
+            answers = milvus_client.search_and_generate_batch([query for query, _ in batch], k)
+            for (query, extra), (answer, hits) in zip(batch, answers):
+                output.write(json.dumps(
+                    {**extra, "query": query, "answer": answer, "results": [hit_to_dict(hit) for hit in hits]},
+                    ensure_ascii=False
+                ) + "\n")
+            stats["queries"] += len(batch)
+            stats["batches"] += 1
+            elapsed = time.perf_counter() - start
+            print(f"Обработано {stats['queries']} запросов ({stats['queries'] / elapsed:.1f} запр/с)", end="\r")
+    stats["elapsed_s"] = time.perf_counter() - start
+    stats["queries_per_s"] = stats["queries"] / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетные ответы на запросы из файла (журналы вопросов, заполнение FAQ)")
+    parser.add_argument("input", help="Текстовый файл (запрос на строку) или JSONL с полем query/question")
+    parser.add_argument("--results", default="batch_answers.jsonl", help="Куда записать ответы (JSONL)")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=256, help="Сколько запросов обрабатывается за один проход")
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    milvus_client = MilvusClient()
+    milvus_client.create_index(milvus_client.get_qa_collection())
+    stats = answer_file(milvus_client, args.input, args.results, k=args.k, batch_size=args.batch_size)
+    snapshot = metrics.snapshot()
+    report = {**stats, "answer_paths": snapshot["counters"], "stages": snapshot["stages"]}
+
+    print(f"\nЗапросов: {stats['queries']}, пачек: {stats['batches']}, {stats['elapsed_s']:.1f} с, "
+          f"{stats['queries_per_s']:.1f} запр/с")
+    for name, value in sorted(snapshot["counters"].items()):
+        print(f"  {name}: {value}")
+    print(f"Ответы записаны в {args.results}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timezone
+
+# Замеряемые этапы конвейера: поиск, фильтрация, QA-модель и весь search_and_generate
+STAGES = ("search_qa", "filter_relevant_results", "generate_answer", "search_and_generate")
+
+
+def percentiles(samples):
+    import numpy as np
+    values = 1000 * np.asarray(samples, dtype=np.float64)
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+def run_worker(size, workdir, queries_count, k, batch_size, seed):
+    """Замер одного размера корпуса; выполняется в отдельном процессе, чтобы пиковый RSS не смешивался"""
+    from utils.milvus_client import MilvusClient
+    from utils.bulk_loader import BulkLoader, iter_records
+    from utils.metrics import metrics
+    from utils.synthetic_corpus import write_corpus, generate_queries
+
+    corpus_path = write_corpus(os.path.join(workdir, "corpus.jsonl"), size, seed=seed)
+
+    client = MilvusClient()
+    start = time.perf_counter()
+    duplicates = client.find_duplicates(iter_records(corpus_path))
+
+    def corpus():
+        return duplicates.collapse(iter_records(corpus_path))
+
+    client.fit_embedding_profile(corpus())
+    collection = client.create_qa_collection()
+    BulkLoader(client, collection, batch_size=batch_size).run(corpus())
+    client.update_lexical_index(corpus())
+    client.update_token_store(corpus())
+    client.update_category_router(corpus())
+    client.create_index(collection)
+    ingest_s = time.perf_counter() - start
+    rss_after_ingest = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    records = list(iter_records(corpus_path))
+    queries = generate_queries(records, queries_count, seed=seed)
+    del records
+
+    # Первый запрос загружает QA-модель и в замеры не входит
+    start = time.perf_counter()
+    client.search_and_generate(queries[0], k)
+    warmup_s = time.perf_counter() - start
+
+    samples = {stage: [] for stage in STAGES}
+    for query in queries:
+        start = time.perf_counter()
+        results = client.search_qa(query, k)
+        samples["search_qa"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        filtered = client.filter_relevant_results(query, results)
+        samples["filter_relevant_results"].append(time.perf_counter() - start)
+
+        context = client.build_context(filtered)
+        start = time.perf_counter()
+        client.generate_answer(query, context)
+        samples["generate_answer"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        client.search_and_generate(query, k)
+        samples["search_and_generate"].append(time.perf_counter() - start)
+
+    return {
+        "size": size,
+        "queries": len(queries),
+        "ingest_s": ingest_s,
+        "ingest_docs_per_s": size / ingest_s,
+        "deduplication": duplicates.stats(),
+        "warmup_s": warmup_s,
+        "latency": {stage: percentiles(values) for stage, values in samples.items()},
+        "rss_after_ingest_mb": rss_after_ingest,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "answer_paths": client.faq.stats()["counts"],
+        "stages": metrics.snapshot()["stages"],
+    }
+
+
+def worker_env(workdir, production_paths):
+    """Локальное хранилище и все артефакты корпуса — в рабочей папке размера, без сети"""
+    env = dict(
+        os.environ,
+        VECTOR_BACKEND="local",
+        LOCAL_STORE_DIR=os.path.join(workdir, "store"),
+        LEXICAL_INDEX_PATH=os.path.join(workdir, "lexical_index.pkl"),
+        TOKEN_STORE_DIR=os.path.join(workdir, "tokens"),
+        CATEGORY_ROUTER_PATH=os.path.join(workdir, "category_router.npz"),
+        EMBEDDING_CACHE_DIR=os.path.join(workdir, "embeddings"),
+        EMBEDDING_PROFILE_DIR=os.path.join(workdir, "profiles"),
+        HF_HUB_OFFLINE="1",
+        TRANSFORMERS_OFFLINE="1",
+    )
+    env.pop("QUERY_CACHE_PATH", None)
+    if not production_paths:
+        # Кэши и быстрый путь отключены, чтобы каждый запрос проходил весь конвейер
+        env.update(QUERY_CACHE_SIZE="0", ANSWER_CACHE_SIZE="0", FAQ_FAST_PATH="0")
+    return env
+
+
+def run_size(size, args):
+    workdir = os.path.abspath(os.path.join(args.workdir, str(size)))
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", str(size), "--workdir", workdir,
+         "--queries", str(args.queries), "-k", str(args.k), "--batch-size", str(args.batch_size),
+         "--seed", str(args.seed)],
+        env=worker_env(workdir, args.production_paths), capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("REPORT "):
+            return json.loads(line[len("REPORT "):])
+    raise RuntimeError(f"Замер корпуса {size} завершился с ошибкой:\n{completed.stderr[-2000:]}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной замер конвейера на синтетических корпусах без сети")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Размеры корпусов через запятую")
+    parser.add_argument("--queries", type=int, default=200, help="Число запросов на каждый размер")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=512, help="Размер батча кодирования и вставки")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default="data/benchmark", help="Папка для корпусов и локальных хранилищ")
+    parser.add_argument("--production-paths", action="store_true",
+                        help="Не отключать кэши и быстрый путь FAQ (по умолчанию каждый запрос идёт через весь конвейер)")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        row = run_worker(args.worker, args.workdir, args.queries, args.k, args.batch_size, args.seed)
+        print("REPORT " + json.dumps(row, ensure_ascii=False))
+        return
+
+    report = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "queries": args.queries, "k": args.k, "batch_size": args.batch_size, "seed": args.seed,
+            "production_paths": args.production_paths,
+            "embedding_profile": os.getenv("EMBEDDING_PROFILE", "full"),
+            "retrieval_mode": os.getenv("RETRIEVAL_MODE", "dense"),
+            "qa_backend": os.getenv("QA_BACKEND", "torch"),
+        },
+        "sizes": {},
+    }
+    for size in (int(value) for value in args.sizes.split(",")):
+        print(f"Корпус {size} записей...")
+        report["sizes"][str(size)] = run_size(size, args)
+
+    print(f"\n{'записей':>9}{'загрузка, док/с':>17}{'этап':>26}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'RSS, МБ':>10}")
+    for size, row in report["sizes"].items():
+        for i, stage in enumerate(STAGES):
+            latency = row["latency"][stage]
+            prefix = f"{size:>9}{row['ingest_docs_per_s']:>17.1f}" if i == 0 else " " * 26
+            suffix = f"{row['peak_rss_mb']:>10.0f}" if i == 0 else ""
+            print(f"{prefix}{stage:>26}{latency['p50_ms']:>10.1f}{latency['p95_ms']:>10.1f}{latency['p99_ms']:>10.1f}{suffix}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
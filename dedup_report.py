@@ -0,0 +1,111 @@
+import os
+import json
+import argparse
+from dotenv import load_dotenv
+from utils.bulk_loader import iter_records
+from utils.dedup import DuplicateIndex, unique_hits, unique_texts
+from utils.embedding_profile import EmbeddingProfile
+from utils.lexical_index import LexicalIndex
+from utils.passages import iter_passages, split_passages, qa_context
+
+load_dotenv()
+
+
+def context_stats(index, queries, k, max_chars, threshold):
+    """Средний размер контекста QA-модели на запрос: top-k BM25 без и с удалением повторов"""
+    totals = {"passages": 0, "chars": 0, "passages_dedup": 0, "chars_dedup": 0}
+    for query in queries:
+        hits = index.search(query, k)
+        contexts = [
+            qa_context(hit.entity.question, passage)
+            for hit in hits
+            for passage in split_passages(hit.entity.answer, max_chars)
+        ]
+        totals["passages"] += len(contexts)
+        totals["chars"] += sum(len(context) for context in contexts)
+        if threshold > 0:
+            hits = unique_hits(hits)
+            contexts = unique_texts([
+                qa_context(hit.entity.question, passage)
+                for hit in hits
+                for passage in split_passages(hit.entity.answer, max_chars)
+            ])
+        totals["passages_dedup"] += len(contexts)
+        totals["chars_dedup"] += sum(len(context) for context in contexts)
+    return {name: value / max(len(queries), 1) for name, value in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повторяющиеся записи: сокращение коллекции и длины контекста")
+    parser.add_argument("--data", default="data/medical_data.json", help="JSON-массив или JSONL с записями")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Порог сходства для поиска почти повторов (по умолчанию DEDUP_THRESHOLD, если он задан, иначе 0.8)")
+    parser.add_argument("--queries", help="Файл запросов (по строке); по умолчанию — вопросы самих записей")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--passage-max-chars", type=int, default=800)
+    parser.add_argument("--dim", type=int, default=1024, help="Размерность эмбеддингов энкодера")
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    threshold = args.threshold if args.threshold is not None else float(os.getenv("DEDUP_THRESHOLD") or "0.8")
+    duplicates = DuplicateIndex.build(iter_records(args.data), threshold)
+    records = list(iter_records(args.data))
+    collapsed = list(duplicates.collapse(records))
+
+    bytes_per_vector = EmbeddingProfile.from_env().bytes_per_vector(args.dim)
+    passages_before = sum(1 for _ in iter_passages(records, args.passage_max_chars))
+    passages_after = sum(1 for _ in iter_passages(collapsed, args.passage_max_chars))
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as file:
+            queries = [line.strip() for line in file if line.strip()]
+    else:
+        queries = [doc["question"] for doc in records]
+
+    # Поиск по исходному корпусу без удаления повторов и по свёрнутому корпусу с удалением повторов в выдаче
+    before = context_stats(LexicalIndex.build(records), queries, args.k, args.passage_max_chars, 0)
+    after = context_stats(LexicalIndex.build(collapsed), queries, args.k, args.passage_max_chars, threshold)
+
+    report = {
+        "threshold": threshold,
+        "deduplication": duplicates.stats(),
+        "passages": {"before": passages_before, "after": passages_after},
+        "vector_bytes": {
+            "before": passages_before * bytes_per_vector,
+            "after": passages_after * bytes_per_vector,
+        },
+        "context_per_query": {
+            "queries": len(queries),
+            "k": args.k,
+            "before": {"passages": before["passages"], "chars": before["chars"]},
+            "after": {"passages": after["passages_dedup"], "chars": after["chars_dedup"]},
+        },
+        "groups": [
+            {"id": doc["id"], "question": doc["question"], "aliases": doc["aliases"]}
+            for doc in collapsed if doc.get("aliases")
+        ],
+        # Почти повторы с разными ответами не сворачиваются: у каждой записи остаются свой вектор и ответ
+        "near_duplicates": {str(doc_id): similar for doc_id, similar in duplicates.near_duplicates.items()},
+    }
+
+    stats = report["deduplication"]
+    context = report["context_per_query"]
+    print(f"Порог: {threshold}")
+    print(f"{'':<24}{'до':>12}{'после':>12}")
+    print(f"{'записей':<24}{stats['records']:>12}{stats['canonical']:>12}")
+    print(f"{'фрагментов (векторов)':<24}{passages_before:>12}{passages_after:>12}")
+    print(f"{'векторы, КБ':<24}{report['vector_bytes']['before'] / 1024:>12.1f}{report['vector_bytes']['after'] / 1024:>12.1f}")
+    print(f"{'фрагментов на запрос':<24}{context['before']['passages']:>12.2f}{context['after']['passages']:>12.2f}")
+    print(f"{'символов на запрос':<24}{context['before']['chars']:>12.0f}{context['after']['chars']:>12.0f}")
+    print(f"{'почти повторов':<24}{stats['near_duplicates']:>12}{'(не свёрнуты)':>14}")
+    for group in report["groups"]:
+        print(f"\n[{group['id']}] {group['question']}")
+        for alias in group["aliases"]:
+            print(f"    = [{alias['id']}] {alias['question']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
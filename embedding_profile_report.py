@@ -0,0 +1,93 @@
+import json
+import time
+import argparse
+import numpy as np
+from utils import model_registry
+from utils.bulk_loader import iter_records
+from utils.embedding_store import EmbeddingStore
+from utils.embedding_profile import EmbeddingProfile, PROFILE_PRESETS
+
+
+def document_texts(records):
+    return [f"Вопрос: {doc['question']} Ответ: {doc['answer']}" for doc in records]
+
+
+def top_k(queries, documents, k):
+    """Точный поиск по косинусу (векторы нормированы)"""
+    scores = queries @ documents.T
+    k = min(k, documents.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def encode_model(model_name, records, queries):
+    """Сырые эмбеддинги документов (через дисковый кэш) и запросов с замером времени кодирования"""
+    model = model_registry.get_embedding_model(model_name)
+    store = EmbeddingStore(model_name)
+    documents = store.encode(model, document_texts(records))
+    texts = [f"Вопрос: {query}" for query in queries]
+    model.encode(texts[:1])  # прогрев
+    start = time.perf_counter()
+    query_vectors = model.encode(texts)
+    seconds = time.perf_counter() - start
+    return np.asarray(documents, dtype=np.float32), np.asarray(query_vectors, dtype=np.float32), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Полнота recall@k профилей эмбеддингов относительно полного e5-large 1024-d")
+    parser.add_argument("--profiles", default=",".join(PROFILE_PRESETS), help="Профили через запятую")
+    parser.add_argument("--data", default="data/medical_data.json")
+    parser.add_argument("--queries", type=int, default=500, help="Сколько вопросов из данных использовать как запросы")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--profile-dir", default="data/profiles/report", help="Куда сохранять обученные PCA-проекции")
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    records = list(iter_records(args.data))
+    queries = [doc["question"] for doc in records[:args.queries]]
+    print(f"Документов: {len(records)}, запросов: {len(queries)}, k={args.k}")
+
+    encoded = {}
+    baseline = EmbeddingProfile("full", root=args.profile_dir)
+    encoded[baseline.model_name] = encode_model(baseline.model_name, records, queries)
+    documents, query_vectors, _ = encoded[baseline.model_name]
+    truth = top_k(baseline.project(query_vectors), baseline.project(documents), args.k)
+
+    report = {}
+    for name in args.profiles.split(","):
+        params = {"model_name": model_registry.EMBEDDING_MODEL_NAME, **PROFILE_PRESETS[name]}
+        profile = EmbeddingProfile(name, root=args.profile_dir, **params)
+        if profile.model_name not in encoded:
+            encoded[profile.model_name] = encode_model(profile.model_name, records, queries)
+        documents, query_vectors, seconds = encoded[profile.model_name]
+        try:
+            profile.fit(documents)
+        except ValueError as e:
+            print(f"{name}: пропущен ({e})")
+            continue
+        stored = profile.quantize(profile.project(documents))
+        found = top_k(profile.quantize(profile.project(query_vectors)), stored, args.k)
+        recall = sum(len(a & b) for a, b in zip(found, truth)) / (len(truth) * min(args.k, len(records)))
+        report[name] = {
+            "model_name": profile.model_name,
+            "dim": stored.shape[1],
+            "dtype": profile.dtype,
+            "projection": profile.projection,
+            f"recall@{args.k}": recall,
+            "bytes_per_vector": profile.bytes_per_vector(documents.shape[1]),
+            "query_encode_ms": 1000 * seconds / len(queries),
+        }
+
+    print(f"\n{'профиль':<14}{'размерн.':>9}{'тип':>9}{'байт/вектор':>13}{f'recall@{args.k}':>11}{'мс/запрос':>11}")
+    for name, row in report.items():
+        print(
+            f"{name:<14}{row['dim']:>9}{row['dtype']:>9}{row['bytes_per_vector']:>13}"
+            f"{row[f'recall@{args.k}']:>11.3f}{row['query_encode_ms']:>11.1f}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
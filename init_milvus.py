@@ -1,9 +1,8 @@
-import os
 import json
+import argparse
 from dotenv import load_dotenv
 from utils.milvus_client import MilvusClient
-from pymilvus import utility
-from tqdm import tqdm
+from utils.bulk_loader import BulkLoader, iter_records
 
 load_dotenv()
 
@@ -11,25 +10,43 @@ def load_medical_data(file_path="data/medical_data.json"):
     with open(file_path, "r", encoding="utf-8") as file:
         return json.load(file)
 
-def initialize_milvus():
+def initialize_milvus(file_path="data/medical_data.json", batch_size=512, rebuild=False):
     print("Инициализация Milvus...")
     milvus_client = MilvusClient()
-    data = load_medical_data()
+    # Записи с одинаковым ответом хранятся одной канонической записью с псевдонимами (при DEDUP_THRESHOLD > 0)
+    duplicates = milvus_client.find_duplicates(iter_records(file_path))
 
-    if not utility.has_collection(milvus_client.qa_collection_name):
+    def records():
+        return duplicates.collapse(iter_records(file_path))
+
+    # PCA-проекция профиля эмбеддингов обучается до создания коллекции
+    milvus_client.fit_embedding_profile(records())
+
+    if rebuild or not milvus_client.vector_backend.has_collection(milvus_client.qa_collection_name):
         print("Создание коллекции...")
         collection = milvus_client.create_qa_collection()
 
-        print("Вставка данных...")
-        batch_size = 10
-        for i in tqdm(range(0, len(data), batch_size), desc="Загрузка данных"):
-            batch = data[i:i + batch_size]
-            milvus_client.insert_qa_data(collection, batch)
+        # Записи читаются потоково (JSON-массив или JSONL), кодирование и вставка идут параллельно
+        print("Потоковая загрузка данных...")
+        loader = BulkLoader(milvus_client, collection, batch_size=batch_size)
+        loader.run(records())
+        milvus_client.update_lexical_index(records())
+        milvus_client.update_token_store(records())
+        milvus_client.update_category_router(records())
 
         print("Создание индекса...")
         milvus_client.create_index(collection)
     else:
-        print("Коллекция уже существует, подключаемся к ней...")
+        print("Коллекция уже существует, синхронизируем изменения...")
+        data = list(records())
+        collection = milvus_client.get_qa_collection()
+        milvus_client.sync_qa_data(collection, data)
+        milvus_client.create_index(collection)
 
 if __name__ == "__main__":
-    initialize_milvus()
+    parser = argparse.ArgumentParser(description="Загрузка медицинских данных в Milvus")
+    parser.add_argument("--data", default="data/medical_data.json", help="JSON-массив или JSONL с записями")
+    parser.add_argument("--batch-size", type=int, default=512, help="Размер батча кодирования и вставки")
+    parser.add_argument("--rebuild", action="store_true", help="Пересоздать коллекцию и загрузить всё заново")
+    args = parser.parse_args()
+    initialize_milvus(args.data, batch_size=args.batch_size, rebuild=args.rebuild)
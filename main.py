@@ -1,44 +1,75 @@
 import os
 import json
+import logging
 from dotenv import load_dotenv
 from utils.milvus_client import MilvusClient
-from tqdm import tqdm
 
 load_dotenv()
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 def load_medical_data(file_path="data/medical_data.json"):
     with open(file_path, "r", encoding="utf-8") as file:
         return json.load(file)
 
-def initialize_milvus():
+def initialize_milvus(milvus_client=None):
     print("Инициализация Milvus...")
-    milvus_client = MilvusClient()
-    from pymilvus import utility
-    try:
-        if utility.has_collection(milvus_client.qa_collection_name):
-            print(f"Найдена существующая коллекция '{milvus_client.qa_collection_name}'. Удаляем...")
-            utility.drop_collection(milvus_client.qa_collection_name)
-            print("Коллекция удалена.")
-    except Exception as e:
-        print(f"Ошибка при удалении коллекции: {e}")
+    if milvus_client is None:
+        milvus_client = MilvusClient()
+    vector_backend = milvus_client.vector_backend
+    # INGEST_MODE=rebuild — полная пересборка коллекции, по умолчанию только дозагрузка изменений
+    if os.getenv("INGEST_MODE", "incremental") == "rebuild":
+        try:
+            if vector_backend.has_collection(milvus_client.qa_collection_name):
+                print(f"Найдена существующая коллекция '{milvus_client.qa_collection_name}'. Удаляем...")
+                vector_backend.drop_collection(milvus_client.qa_collection_name)
+                print("Коллекция удалена.")
+        except Exception as e:
+            print(f"Ошибка при удалении коллекции: {e}")
     data = load_medical_data()
     qa_data = [doc for doc in data if "options" not in doc]
-    print("Создание коллекции для вопросов-ответов...")
-    qa_collection = milvus_client.create_qa_collection()
-    print(f"Коллекция создана с размерностью {milvus_client.embedding_model.get_sentence_embedding_dimension()}")
-    print("Вставка данных в коллекцию вопросов-ответов...")
-    milvus_client.insert_qa_data(qa_collection, qa_data)
-    print(f"Вставлено {len(qa_data)} записей")
+    # Записи с одинаковым ответом хранятся одной канонической записью с псевдонимами (при DEDUP_THRESHOLD > 0)
+    qa_data = milvus_client.deduplicate(qa_data)
+    # PCA-проекция профиля эмбеддингов обучается до создания коллекции
+    milvus_client.fit_embedding_profile(qa_data)
+    print("Подготовка коллекции для вопросов-ответов...")
+    qa_collection = milvus_client.get_qa_collection()
+    print("Синхронизация данных с коллекцией вопросов-ответов...")
+    milvus_client.sync_qa_data(qa_collection, qa_data)
     milvus_client.create_index(qa_collection)
-    print("Индекс создан и коллекция загружена")
+    print("Индекс готов и коллекция загружена")
     return milvus_client
 
-milvus_client = initialize_milvus()
+milvus_client = MilvusClient()
+
+# INFERENCE_WORKERS > 0 — энкодер и QA-модель работают в пуле процессов с общими весами.
+# Пул запускается до загрузки данных: она выполняет прямые проходы энкодера в этом процессе,
+# а OpenMP, инициализированный до fork, может зависнуть в дочерних процессах
+if int(os.getenv("INFERENCE_WORKERS", "0")) > 0:
+    milvus_client.start_inference_pool(
+        int(os.getenv("INFERENCE_WORKERS")), int(os.getenv("INFERENCE_THREADS", "0")) or None
+    )
+
+initialize_milvus(milvus_client)
+
+# BATCHING_ENABLED=1 — одновременные запросы сессий объединяются в батчи для энкодера и QA-модели
+inference_server = None
+if os.getenv("BATCHING_ENABLED", "0") == "1":
+    from utils.batching import BatchingInferenceServer
+    inference_server = BatchingInferenceServer(
+        milvus_client,
+        max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "16")),
+        max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+    ).start()
 
 def search(query, k=3):
-    print(f"Обработка запроса: {query}")
-    answer, results = milvus_client.search_and_generate(query, k)
-    print(f"Найдено {len(results)} релевантных результатов")
+    logger.info("Обработка запроса: %s", query)
+    if inference_server is not None:
+        answer, results = inference_server.search_sync(query, k)
+    else:
+        answer, results = milvus_client.search_and_generate(query, k)
+    logger.info("Найдено %d релевантных результатов", len(results))
     return answer, results
 
 if __name__ == "__main__":
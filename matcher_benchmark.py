@@ -0,0 +1,113 @@
+import json
+import timeit
+import argparse
+from utils.bulk_loader import iter_records
+from utils.query_matcher import QueryMatcher
+
+
+# Прежняя обработка запроса: каждый этап заново приводит запрос к нижнему регистру и перебирает списки слов
+
+def legacy_classify_query(query):
+    query_lower = query.lower()
+    if any(word in query_lower for word in ['записаться', 'запись', 'прием', 'приём', 'врач', 'специалист']):
+        return 'appointment'
+    elif any(word in query_lower for word in ['документ', 'справка', 'полис', 'паспорт', 'снилс']):
+        return 'documents'
+    elif any(word in query_lower for word in ['анализ', 'тест', 'исследование', 'диабет', 'глюкоза', 'кровь', 'моча']):
+        return 'tests'
+    elif any(word in query_lower for word in ['подготовка', 'подготовиться', 'как подготовиться']):
+        return 'preparation'
+    return 'general'
+
+
+def legacy_extract_keywords(query):
+    stop_words = {'как', 'что', 'где', 'когда', 'нужно', 'можно', 'надо', 'нужны', 'какие', 'какой'}
+    words = [word.strip("?,!.") for word in query.lower().split()]
+    return [word for word in words if word not in stop_words and len(word) > 3]
+
+
+def legacy_filter_words(query):
+    return [word for word in query.lower().split() if len(word) > 3]
+
+
+def legacy_fallback_topic(query):
+    query_lower = query.lower()
+    if any(word in query_lower for word in ['записаться', 'прием', 'регистратура']):
+        return 'fallback_appointment'
+    elif any(word in query_lower for word in ['документ', 'справка', 'полис']):
+        return 'fallback_documents'
+    return None
+
+
+def legacy_pipeline(query):
+    # generate_answer классифицирует запрос дважды: для промпта и для завершения ответа
+    return (
+        legacy_classify_query(query),
+        legacy_classify_query(query),
+        legacy_extract_keywords(query),
+        legacy_filter_words(query),
+        legacy_fallback_topic(query),
+    )
+
+
+def compiled_pipeline(matcher, query):
+    query_match = matcher._match(query)
+    fallback = next((label for label in ("fallback_appointment", "fallback_documents") if query_match.has(label)), None)
+    return query_match.question_type, query_match.keywords, fallback
+
+
+def load_queries(file_path, repeat):
+    questions = [doc["question"] for doc in iter_records(file_path)]
+    extra = [
+        "Как записаться на приём к врачу-кардиологу?",
+        "Какие документы нужны для получения справки в бассейн?",
+        "Где сдать анализ крови на глюкозу натощак?",
+        "Как подготовиться к УЗИ брюшной полости?",
+        "Сколько стоит консультация?",
+    ]
+    return (questions + extra) * repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость разбора запроса: прежние функции против скомпилированного матчера")
+    parser.add_argument("--data", default="data/medical_data.json")
+    parser.add_argument("--repeat", type=int, default=20, help="Сколько раз повторить набор запросов")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.data, args.repeat)
+    matcher = QueryMatcher()
+
+    def best_us(function):
+        seconds = min(timeit.repeat(lambda: [function(query) for query in queries], number=1, repeat=args.rounds))
+        return 1e6 * seconds / len(queries)
+
+    report = {
+        "queries": len(queries),
+        "legacy_us_per_query": best_us(legacy_pipeline),
+        "compiled_us_per_query": best_us(lambda query: compiled_pipeline(matcher, query)),
+        "cached_us_per_query": best_us(matcher.match),
+    }
+    unique = list(dict.fromkeys(queries))
+    disagreements = [
+        {"query": query, "legacy": legacy_classify_query(query), "compiled": matcher.match(query).question_type}
+        for query in unique if legacy_classify_query(query) != matcher.match(query).question_type
+    ]
+    report["question_type_agreement"] = 1 - len(disagreements) / len(unique)
+    report["disagreements"] = disagreements
+
+    print(f"Запросов: {report['queries']}")
+    print(f"{'прежние функции':<24}{report['legacy_us_per_query']:>10.1f} мкс/запрос")
+    print(f"{'скомпилированный матчер':<24}{report['compiled_us_per_query']:>10.1f} мкс/запрос")
+    print(f"{'матчер, повтор из кэша':<24}{report['cached_us_per_query']:>10.1f} мкс/запрос")
+    print(f"Совпадение типа вопроса: {report['question_type_agreement']:.1%}")
+    for row in disagreements:
+        print(f"  {row['query']}: {row['legacy']} -> {row['compiled']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
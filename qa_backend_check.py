@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import argparse
+from collections import Counter
+from dotenv import load_dotenv
+from utils import model_registry
+from utils.qa_inference import extract_best_spans
+from utils.passages import split_passages, qa_context
+from utils.tokenization import normalize_text
+
+load_dotenv()
+
+
+def qa_params():
+    """Окна и батчи QA-модели с теми же настройками, что у MilvusClient.generate_answers"""
+    return {
+        "max_length": int(os.getenv("QA_MAX_LENGTH", "384")),
+        "stride": int(os.getenv("QA_STRIDE", "128")),
+        "batch_size": int(os.getenv("QA_BATCH_SIZE", "16")),
+        "max_answer_tokens": int(os.getenv("QA_MAX_ANSWER_TOKENS", "64")),
+    }
+
+
+def load_pairs(file_path, limit=None):
+    """
+    Пары (вопрос, фрагменты) из набора данных: контекст собирается так же, как для одного найденного документа
+    в build_context — фрагменты ответа длиной до PASSAGE_MAX_CHARS
+    """
+    max_chars = int(os.getenv("PASSAGE_MAX_CHARS", "800"))
+    with open(file_path, "r", encoding="utf-8") as file:
+        data = [doc for doc in json.load(file) if "options" not in doc]
+    data = data[:limit] if limit else data
+    return [
+        (doc["question"], [qa_context(doc["question"], passage) for passage in split_passages(doc["answer"], max_chars)])
+        for doc in data
+    ]
+
+
+def best_texts(tokenizer, model, pairs, params):
+    spans = extract_best_spans(tokenizer, model, [q for q, _ in pairs], [c for _, c in pairs], **params)
+    return [candidates[0]["text"] if candidates else "" for candidates in spans]
+
+
+def token_f1(prediction, reference):
+    prediction_tokens = normalize_text(prediction).split()
+    reference_tokens = normalize_text(reference).split()
+    if not prediction_tokens or not reference_tokens:
+        return float(prediction_tokens == reference_tokens)
+    common = sum((Counter(prediction_tokens) & Counter(reference_tokens)).values())
+    if common == 0:
+        return 0.0
+    precision = common / len(prediction_tokens)
+    recall = common / len(reference_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def run_backend(backend, pairs, batch_size, params):
+    """Ответы бэкенда через рабочий путь extract_best_spans (окна со stride, батчи окон)"""
+    tokenizer = model_registry.get_qa_tokenizer()
+    model = model_registry.get_qa_model(backend=backend)
+    # Прогрев, чтобы не учитывать ленивую инициализацию в замере
+    best_texts(tokenizer, model, pairs[:1], params)
+    spans = []
+    start = time.perf_counter()
+    for i in range(0, len(pairs), batch_size):
+        spans.extend(best_texts(tokenizer, model, pairs[i:i + batch_size], params))
+    return spans, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение ответов и скорости QA-бэкендов с fp32-моделью")
+    parser.add_argument("--backends", default="int8,onnx", help="Проверяемые бэкенды через запятую")
+    parser.add_argument("--data", default="data/medical_data.json")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1, help="Вопросов в одном вызове extract_best_spans")
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.data, args.limit)
+    params = qa_params()
+    print(f"Эталон: fp32 (torch), примеров: {len(pairs)}, окно {params['max_length']}, перекрытие {params['stride']}")
+    reference, reference_time = run_backend("torch", pairs, args.batch_size, params)
+    report = {
+        "settings": params,
+        "torch": {"seconds": reference_time, "ms_per_query": 1000 * reference_time / len(pairs)},
+    }
+
+    for backend in args.backends.split(","):
+        try:
+            spans, seconds = run_backend(backend, pairs, args.batch_size, params)
+        except ImportError as e:
+            print(f"{backend}: пропущен ({e})")
+            continue
+        exact = sum(normalize_text(a) == normalize_text(b) for a, b in zip(spans, reference)) / len(pairs)
+        f1 = sum(token_f1(a, b) for a, b in zip(spans, reference)) / len(pairs)
+        report[backend] = {
+            "seconds": seconds,
+            "ms_per_query": 1000 * seconds / len(pairs),
+            "speedup": reference_time / seconds if seconds else 0.0,
+            "exact_match": exact,
+            "f1": f1,
+            "mismatches": [
+                {"question": q, "fp32": b, backend: a}
+                for (q, _), a, b in zip(pairs, spans, reference)
+                if normalize_text(a) != normalize_text(b)
+            ],
+        }
+
+    print(f"\n{'бэкенд':<8}{'мс/запрос':>11}{'ускорение':>11}{'EM':>7}{'F1':>7}")
+    for backend, row in report.items():
+        if backend == "settings":
+            continue
+        print(
+            f"{backend:<8}{row['ms_per_query']:>11.1f}{row.get('speedup', 1.0):>11.2f}"
+            f"{row.get('exact_match', 1.0):>7.2f}{row.get('f1', 1.0):>7.2f}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
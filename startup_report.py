@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Код, выполняемый в отдельном процессе для каждого режима загрузки моделей
+PROBE = r"""
+import json, resource, sys, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+import main
+ready = time.perf_counter()
+rss_ready = rss_mb()
+main.search(sys.argv[1])
+first_answer = time.perf_counter()
+rss_first_answer = rss_mb()
+
+# Второй клиент в том же процессе должен переиспользовать уже загруженные модели
+from utils.milvus_client import MilvusClient
+second_client = MilvusClient()
+second_client.search_and_generate(sys.argv[1] + " ")
+rss_second_client = rss_mb()
+
+print("REPORT " + json.dumps({
+    "startup_s": ready - start,
+    "time_to_first_answer_s": first_answer - start,
+    "rss_ready_mb": rss_ready,
+    "rss_first_answer_mb": rss_first_answer,
+    "rss_after_second_client_mb": rss_second_client,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def run_probe(mode, query):
+    # Кэш ответов и быстрый путь FAQ отключены: иначе вопрос из базы отвечается без энкодера и QA-модели
+    env = dict(os.environ, MODEL_LOADING=mode, ANSWER_CACHE_SIZE="0", FAQ_FAST_PATH="0")
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, query],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("REPORT "):
+            return json.loads(line[len("REPORT "):])
+    raise RuntimeError(f"Режим {mode} завершился с ошибкой:\n{completed.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время до первого ответа и RSS при разных режимах загрузки моделей")
+    parser.add_argument("--query", default="Как записаться на прием к врачу?")
+    parser.add_argument("--modes", default="eager,background,lazy",
+                        help="eager — как раньше, загрузка в конструкторе; background/lazy — реестр моделей")
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for mode in args.modes.split(","):
+        print(f"Замер режима MODEL_LOADING={mode}...")
+        report[mode] = run_probe(mode, args.query)
+
+    print(f"\n{'режим':<12}{'старт, с':>10}{'1-й ответ, с':>14}{'RSS, МБ':>10}{'RSS 2 клиента, МБ':>19}")
+    for mode, row in report.items():
+        print(
+            f"{mode:<12}{row['startup_s']:>10.1f}{row['time_to_first_answer_s']:>14.1f}"
+            f"{row['rss_first_answer_mb']:>10.0f}{row['rss_after_second_client_mb']:>19.0f}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import io
+import json
+from utils.bulk_loader import iter_json_array
+
+RECORDS = [
+    {"id": 12345, "score": -0.125e3, "ok": True, "url": None},
+    [1, 22, 333],
+    98765,
+    "строка",
+    False,
+    None,
+    3.25,
+]
+
+
+def test_iter_json_array_tiny_chunks():
+    text = " [ " + " , ".join(json.dumps(item, ensure_ascii=False) for item in RECORDS) + " ] "
+    for chunk_size in (1, 2, 3, 5, 7):
+        assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == RECORDS
+
+
+def test_iter_json_array_number_at_end():
+    assert list(iter_json_array(io.StringIO("[1,23,456]"), chunk_size=2)) == [1, 23, 456]
@@ -0,0 +1,64 @@
+from utils.dedup import DuplicateIndex, unique_hits
+from utils.faq import FaqFastPath
+from utils.lexical_index import LexicalIndex
+
+TEMPLATE = (
+    "Записаться на прием к {who} можно несколькими способами:\n"
+    "1) Через сайт клиники: выберите раздел {section}, укажите дату и время, заполните форму записи.\n"
+    "2) По телефону: позвоните в регистратуру клиники и запишитесь на удобное время.\n"
+    "3) Через мобильное приложение клиники: выберите раздел {section} и запишитесь на прием.\n"
+    "4) Лично в регистратуре клиники."
+)
+
+
+def record(doc_id, question, who, section):
+    return {
+        "id": doc_id, "question": question, "answer": TEMPLATE.format(who=who, section=section),
+        "url": f"https://clinic.example/{doc_id}", "category": "Запись",
+    }
+
+
+RECORDS = [
+    record(27, "Как записаться на прием к неврологу?", "неврологу", "неврологии"),
+    record(28, "Как записаться на прием к эндокринологу?", "эндокринологу", "эндокринологии"),
+    # Тот же ответ, что у записи 27, с другой пунктуацией и регистром
+    {**record(40, "Запись к неврологу", "неврологу", "неврологии"),
+     "answer": TEMPLATE.format(who="неврологу", section="неврологии").upper().replace(":", ";")},
+]
+
+
+def test_near_duplicates_with_different_answers_stay_retrievable():
+    duplicates = DuplicateIndex.build(RECORDS, threshold=0.5)
+    collapsed = list(duplicates.collapse(RECORDS))
+    assert [doc["id"] for doc in collapsed] == [27, 28]
+    assert duplicates.near_duplicates == {28: [27]}
+
+    index = LexicalIndex.build(collapsed)
+    assert index.search("эндокринолог запись", k=1)[0].id == 28
+    assert index.search("невролог запись", k=1)[0].id == 27
+
+    faq = FaqFastPath()
+    for doc in RECORDS[:2]:
+        hit = faq.exact(doc["question"], index)
+        assert hit.id == doc["id"]
+        assert hit.entity.answer == doc["answer"]
+
+    hits = index.search("записаться на прием", k=2)
+    assert sorted(hit.id for hit in unique_hits(hits)) == [27, 28]
+
+
+def test_identical_answers_collapse_into_aliases():
+    duplicates = DuplicateIndex.build(RECORDS, threshold=0.5)
+    canonical = next(doc for doc in duplicates.collapse(RECORDS) if doc["id"] == 27)
+    assert [alias["id"] for alias in canonical["aliases"]] == [40]
+    assert duplicates.stats()["aliases"] == 1
+
+    index = LexicalIndex.build(duplicates.collapse(RECORDS))
+    hit = FaqFastPath().exact("Запись к неврологу", index)
+    assert hit.id == 40
+    assert hit.entity.answer == RECORDS[0]["answer"]
+
+
+def test_zero_threshold_disables_collapsing():
+    duplicates = DuplicateIndex.build(RECORDS, threshold=0)
+    assert list(duplicates.collapse(RECORDS)) == RECORDS
@@ -0,0 +1,21 @@
+from utils.embedding_profile import EmbeddingProfile
+
+
+def test_ef_raised_to_search_limit():
+    # k=50 при PASSAGE_OVERFETCH=3 запрашивает 150 фрагментов, больше ef по умолчанию
+    profile = EmbeddingProfile()
+    assert profile.search_params()["params"]["ef"] == 128
+    assert profile.search_params(150)["params"]["ef"] == 150
+    assert profile.search_params(45)["params"]["ef"] == 128
+
+
+def test_ef_from_index_config_raised_to_search_limit():
+    config = {"index_params": {"index_type": "HNSW", "params": {"M": 16}}, "search_params": {"ef": 16}}
+    profile = EmbeddingProfile(index_config=config)
+    assert profile.search_params(60)["params"]["ef"] == 60
+    assert config["search_params"]["ef"] == 16
+
+
+def test_nprobe_not_touched_by_limit():
+    profile = EmbeddingProfile(dtype="int8")
+    assert profile.search_params(150)["params"] == {"nprobe": 16}
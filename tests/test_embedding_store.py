@@ -0,0 +1,17 @@
+import numpy as np
+from utils.embedding_store import EmbeddingStore
+
+
+def test_repeated_key_in_one_batch(tmp_path):
+    store = EmbeddingStore("test-model", root=str(tmp_path))
+    vectors = np.array([[1, 0], [2, 0], [3, 0], [4, 0]], dtype=np.float32)
+    store.add(["a", "b", "a", "c"], vectors)
+
+    assert len(store) == 3
+    assert store.vectors.shape == (3, 2)
+    np.testing.assert_array_equal(store.vectors[[store.index[key] for key in ("a", "b", "c")]], [[1, 0], [2, 0], [4, 0]])
+
+    # После перезагрузки с диска строки по-прежнему совпадают с ключами
+    reloaded = EmbeddingStore("test-model", root=str(tmp_path))
+    assert reloaded.index == store.index
+    np.testing.assert_array_equal(reloaded.vectors[reloaded.index["c"]], [4, 0])
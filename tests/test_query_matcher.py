@@ -0,0 +1,23 @@
+from utils.query_matcher import QueryMatcher
+
+ANSWER = "записаться на прием к стоматологу можно несколькими способами"
+
+
+def test_filter_words_keep_stop_words():
+    # Фильтр результатов, как и прежний (все слова длиннее трёх букв), не отбрасывает стоп-слова
+    query_match = QueryMatcher().match("Когда можно прийти?")
+    assert query_match.words == ("когда", "можно", "прийти")
+    assert query_match.keywords == ("прийти",)
+
+
+def test_stop_word_still_matches_answer():
+    matcher = QueryMatcher()
+    query_match = matcher.match("Что можно сделать?")
+    assert matcher.keyword_pattern(query_match.words).search(ANSWER)
+    assert matcher.keyword_pattern(query_match.keywords).search(ANSWER) is None
+
+
+def test_punctuation_does_not_block_match():
+    matcher = QueryMatcher()
+    query_match = matcher.match("Где стоматологу?")
+    assert matcher.keyword_pattern(query_match.words).search(ANSWER)
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+from utils.milvus_client import MilvusClient
+from utils.bulk_loader import iter_records
+from utils.index_config import INDEX_TYPES, save_index_config
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def exact_top_k(queries, vectors, k):
+    """Точные k ближайших по косинусу (векторы нормированы) — эталон для полноты"""
+    scores = queries @ vectors.T
+    k = min(k, vectors.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def build_index(index_type, vectors, params):
+    """
+    FAISS-аналог индекса Milvus (knowhere строит HNSW и IVF на тех же алгоритмах),
+    метрика — скалярное произведение нормированных векторов, т. е. COSINE
+    """
+    dim = vectors.shape[1]
+    if index_type == "HNSW":
+        index = faiss.IndexHNSWFlat(dim, params["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params["efConstruction"]
+    else:
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "IVF_FLAT":
+            index = faiss.IndexIVFFlat(quantizer, dim, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(
+                quantizer, dim, params["nlist"], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def set_search_param(index, index_type, search_params):
+    if index_type == "HNSW":
+        index.hnsw.efSearch = search_params["ef"]
+    else:
+        index.nprobe = search_params["nprobe"]
+
+
+def measure(index, queries, truth, k):
+    """Полнота recall@k и задержка одиночного запроса (как в search_qa — по одному вектору)"""
+    found = []
+    start = time.perf_counter()
+    for query in queries:
+        _, rows = index.search(query[None, :], k)
+        found.append(set(rows[0].tolist()))
+    latency_ms = 1000 * (time.perf_counter() - start) / len(queries)
+    recall = sum(len(a & b) for a, b in zip(found, truth)) / sum(len(b) for b in truth)
+    return recall, latency_ms
+
+
+def candidates(args, count):
+    """Сетка (тип индекса, параметры построения, параметры поиска)"""
+    for index_type in args.index_types.split(","):
+        if index_type == "HNSW":
+            for m in int_list(args.m):
+                for ef_construction in int_list(args.ef_construction):
+                    # search_qa ищет с limit = search_limit, а Milvus требует ef >= limit
+                    search = [{"ef": ef} for ef in sorted({max(ef, args.search_limit) for ef in int_list(args.ef)})]
+                    yield index_type, {"M": m, "efConstruction": ef_construction}, search
+        elif index_type in ("IVF_FLAT", "IVF_SQ8"):
+            for nlist in int_list(args.nlist):
+                # Для обучения кластеров нужно заметно больше векторов, чем кластеров
+                if nlist * 4 > count:
+                    continue
+                search = [{"nprobe": nprobe} for nprobe in int_list(args.nprobe) if nprobe <= nlist]
+                yield index_type, {"nlist": nlist}, search
+        else:
+            raise ValueError(f"Неизвестный тип индекса: {index_type} (поддерживаются {', '.join(INDEX_TYPES)})")
+
+
+def choose(rows, target_recall):
+    """Самый быстрый вариант с полнотой не ниже цели (при равной задержке — меньший по памяти), иначе самый полный"""
+    passed = [row for row in rows if row["recall"] >= target_recall]
+    if passed:
+        return min(passed, key=lambda row: (round(row["latency_ms"], 2), row["bytes_per_vector"]))
+    return max(rows, key=lambda row: (row["recall"], -row["latency_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор параметров индекса по полноте относительно точного поиска")
+    parser.add_argument("--data", default="data/medical_data.json")
+    parser.add_argument("--queries", type=int, default=500, help="Сколько вопросов из данных использовать как запросы")
+    parser.add_argument("-k", type=int, default=15,
+                        help="k из search_qa: полнота считается как recall@k, limit поиска — k * PASSAGE_OVERFETCH")
+    parser.add_argument("--index-types", default="HNSW,IVF_FLAT,IVF_SQ8")
+    parser.add_argument("--m", default="8,16,32,48")
+    parser.add_argument("--ef-construction", default="100,200,500")
+    parser.add_argument("--ef", default="16,32,64,128,256")
+    parser.add_argument("--nlist", default="64,128,256,1024")
+    parser.add_argument("--nprobe", default="4,8,16,32,64")
+    parser.add_argument("--target-recall", type=float, default=0.98)
+    parser.add_argument("--config", default=os.getenv("INDEX_CONFIG_PATH", "data/index_config.json"),
+                        help="Куда записать выбранные параметры (читаются create_index и search_qa)")
+    parser.add_argument("--dry-run", action="store_true", help="Только таблица, без записи конфигурации")
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    client = MilvusClient()
+    profile = client.embedding_profile
+    records = list(iter_records(args.data))
+    client.fit_embedding_profile(records)
+    vectors = np.ascontiguousarray(profile.quantize(client.encode_documents(records)), dtype=np.float32)
+    query_texts = [doc["question"] for doc in records[:args.queries]]
+    queries = np.ascontiguousarray(np.stack(client.embed_queries(query_texts)), dtype=np.float32)
+    truth = exact_top_k(queries, vectors, args.k)
+    # Столько фрагментов search_qa запрашивает из коллекции: в гибридном режиме — не меньше HYBRID_CANDIDATES
+    candidates_k = max(args.k, client.hybrid_candidates) if client.retrieval_mode == "hybrid" else args.k
+    args.search_limit = candidates_k * client.passage_overfetch
+    print(
+        f"Профиль {profile.name}: {len(vectors)} фрагментов, {vectors.shape[1]}-d, запросов: {len(queries)}, "
+        f"k={args.k}, limit поиска={args.search_limit}"
+    )
+
+    index_types = args.index_types
+    if profile.dtype == "int8":
+        # Профиль int8 хранит int8-коды векторов, т. е. требует IVF_SQ8
+        index_types = "IVF_SQ8"
+    args.index_types = index_types
+
+    rows = []
+    for index_type, index_params, search_grid in candidates(args, len(vectors)):
+        start = time.perf_counter()
+        index = build_index(index_type, vectors, index_params)
+        build_s = time.perf_counter() - start
+        index_bytes = faiss.serialize_index(index).nbytes
+        for search_params in search_grid:
+            set_search_param(index, index_type, search_params)
+            recall, latency_ms = measure(index, queries, truth, args.k)
+            rows.append({
+                "index_type": index_type,
+                "index_params": index_params,
+                "search_params": search_params,
+                "recall": recall,
+                "latency_ms": latency_ms,
+                "build_s": build_s,
+                "bytes_per_vector": index_bytes / len(vectors),
+            })
+
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    _, flat_latency_ms = measure(flat, queries, truth, args.k)
+
+    print(f"\n{'индекс':<10}{'построение':<28}{'поиск':<14}{f'recall@{args.k}':>11}{'мс/запрос':>11}{'байт/вектор':>13}")
+    print(f"{'FLAT':<10}{'-':<28}{'-':<14}{1.0:>11.3f}{flat_latency_ms:>11.3f}{4 * vectors.shape[1]:>13}")
+    for row in rows:
+        build = ", ".join(f"{key}={value}" for key, value in row["index_params"].items())
+        search = ", ".join(f"{key}={value}" for key, value in row["search_params"].items())
+        print(
+            f"{row['index_type']:<10}{build:<28}{search:<14}{row['recall']:>11.3f}"
+            f"{row['latency_ms']:>11.3f}{row['bytes_per_vector']:>13.0f}"
+        )
+
+    best = choose(rows, args.target_recall)
+    index_params = {"index_type": best["index_type"], "params": best["index_params"]}
+    print(
+        f"\nВыбрано: {best['index_type']} {best['index_params']} {best['search_params']} "
+        f"(recall@{args.k}={best['recall']:.3f}, {best['latency_ms']:.3f} мс)"
+    )
+    if best["recall"] < args.target_recall:
+        print(f"Ни один вариант не достиг полноты {args.target_recall}, выбран самый полный")
+    if not args.dry_run:
+        measured = {key: best[key] for key in ("recall", "latency_ms", "bytes_per_vector")}
+        measured.update(k=args.k, vectors=len(vectors))
+        save_index_config(args.config, profile.name, index_params, best["search_params"], measured)
+        print(f"Параметры записаны в {args.config}; индекс будет перестроен при следующем create_index")
+
+    if args.output:
+        report = {
+            "profile": profile.name,
+            "vectors": len(vectors),
+            "queries": len(queries),
+            "k": args.k,
+            "flat_latency_ms": flat_latency_ms,
+            "candidates": rows,
+            "chosen": best,
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import time
+import threading
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Семантический кэш ответов: эмбеддинг запроса -> (ответ, найденные документы).
+    Новый запрос получает сохранённый ответ, если косинусное расстояние до одного из
+    закэшированных запросов не больше max_distance. Записи вытесняются по TTL и по размеру (LRU),
+    весь кэш сбрасывается при смене версии корпуса (повторной загрузке данных).
+    """
+
+    def __init__(self, max_size=512, ttl=3600.0, max_distance=0.03):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.corpus_version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries = [None] * max_size
+        self._created = np.zeros(max_size)
+        self._last_used = np.zeros(max_size)
+        self._used = np.zeros(max_size, dtype=bool)
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def __len__(self):
+        return int(self._used.sum())
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries = [None] * self.max_size
+        self._used[:] = False
+
+    def _check_version(self, corpus_version):
+        if corpus_version != self.corpus_version:
+            self._clear()
+            self.corpus_version = corpus_version
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, embedding, corpus_version, k):
+        """Возвращает (answer, hits) ближайшего закэшированного запроса или None"""
+        if not self.enabled:
+            return None
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(corpus_version)
+            self._used &= (now - self._created) <= self.ttl
+            if self._vectors is None or not self._used.any():
+                self.misses += 1
+                return None
+            similarities = self._vectors @ query
+            similarities[~self._used] = -np.inf
+            for slot in np.argsort(-similarities)[:4]:
+                if 1.0 - similarities[slot] > self.max_distance:
+                    break
+                entry_k, answer, hits = self._entries[slot]
+                if entry_k == k:
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return answer, hits
+            self.misses += 1
+            return None
+
+    def store(self, embedding, answer, hits, corpus_version, k):
+        if not self.enabled:
+            return
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(corpus_version)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+            free = np.flatnonzero(~self._used)
+            # Свободный слот, иначе вытесняем давно не использованную запись
+            slot = free[0] if len(free) else int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._entries[slot] = (k, answer, list(hits))
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._used[slot] = True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,19 @@
+import os
+import json
+from urllib import request
+
+
+def search(query, k=3, base_url=None, timeout=None):
+    """Запрос к HTTP API (/answer); возвращает ответ и найденные документы как словари"""
+    base_url = (base_url or os.getenv("RAG_API_URL", "http://localhost:8000")).rstrip("/")
+    timeout = timeout or float(os.getenv("RAG_API_TIMEOUT", "120"))
+    payload = json.dumps({"query": query, "k": k}, ensure_ascii=False).encode("utf-8")
+    http_request = request.Request(
+        f"{base_url}/answer",
+        data=payload,
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with request.urlopen(http_request, timeout=timeout) as response:
+        body = json.loads(response.read().decode("utf-8"))
+    return body["answer"], body["results"]
@@ -0,0 +1,184 @@
+import time
+import asyncio
+import contextvars
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import metrics
+
+
+class MicroBatcher:
+    """
+    Очередь запросов asyncio, собирающая одновременные вызовы в батч:
+    батч отправляется, когда набралось max_batch_size элементов или прошло max_wait_ms
+    с момента прихода первого. batch_fn(items) -> results выполняется в пуле потоков.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5.0, executor=None, name="batch"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.name = name
+        self.batch_sizes = Counter()
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, item):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            self.batch_sizes[len(items)] += 1
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            self._queue = None
+
+    def stats(self):
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": items / batches if batches else 0.0,
+            "max_batch_size": max(self.batch_sizes) if self.batch_sizes else 0,
+            "histogram": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+class BatchingInferenceServer:
+    """
+    Слой обслуживания для одновременных пользователей: эмбеддинги запросов и прямой проход
+    QA-модели выполняются батчами по всем запросам, пришедшим в одно окно ожидания.
+    Работает в собственном цикле событий в фоновом потоке, поэтому его можно вызывать
+    и из потоков Streamlit (search_sync), и из asyncio-кода (search).
+    """
+
+    def __init__(self, milvus_client, max_batch_size=16, max_wait_ms=5.0, workers=4):
+        self.milvus_client = milvus_client
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.embed_batcher = MicroBatcher(
+            milvus_client.embed_queries, max_batch_size, max_wait_ms, self.executor, name="embed"
+        )
+        self.qa_batcher = MicroBatcher(
+            lambda items: milvus_client.generate_answers(*zip(*items)),
+            max_batch_size, max_wait_ms, self.executor, name="qa"
+        )
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="batching-server", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            if self._loop is not None:
+                asyncio.run_coroutine_threadsafe(self._close_batchers(), self._loop).result()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+                self._loop = None
+                self._thread = None
+
+    async def _close_batchers(self):
+        await self.embed_batcher.close()
+        await self.qa_batcher.close()
+
+    async def _search(self, query, k):
+        with metrics.trace("search_and_generate", query=query, k=k, batching=True) as trace, metrics.span("request"):
+            answer, hits = await self._answer(query, k)
+            trace.update(output=answer)
+        return answer, hits
+
+    def _in_executor(self, func, *args):
+        """Вызов в пуле с контекстом запроса, чтобы этапы попадали в его трассировку"""
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+
+    def _prepare(self, query, started):
+        # Версия корпуса может перечитать индекс с диска, поэтому выполняется в пуле, а не в цикле событий
+        corpus_version = self.milvus_client.corpus_version()
+        return corpus_version, self.milvus_client.exact_answer(query, started)
+
+    async def _answer(self, query, k):
+        """Те же шаги, что у MilvusClient.search_and_generate; энкодер и QA-модель — через микробатчи"""
+        client = self.milvus_client
+        started = time.perf_counter()
+        corpus_version, exact = await self._in_executor(self._prepare, query, started)
+        if exact is not None:
+            return exact
+
+        query_embedding = await self.embed_batcher.submit(query)
+        cached = client.cached_answer(query_embedding, corpus_version, k, started)
+        if cached is not None:
+            return cached
+
+        results = await self._in_executor(client.retrieve, query, k, query_embedding)
+        similar = client.similar_answer(results, started)
+        if similar is not None:
+            return client.store_answer(query_embedding, *similar, corpus_version, k)
+        hits, context = await self._in_executor(client.retrieve_context, query, k, query_embedding, results)
+        answer = await self.qa_batcher.submit((query, context))
+        return client.store_answer(query_embedding, answer, hits, corpus_version, k, started)
+
+    async def search(self, query, k=3):
+        """Асинхронный вызов из любого цикла событий"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._search(query, k), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def search_sync(self, query, k=3):
+        """Блокирующий вызов из обычного потока"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._search(query, k), self._loop).result()
+
+    def stats(self):
+        return {
+            "embed": self.embed_batcher.stats(),
+            "qa": self.qa_batcher.stats(),
+        }
@@ -0,0 +1,164 @@
+import re
+import json
+import time
+import queue
+import threading
+
+_DONE = object()
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(file, chunk_size=1 << 20):
+    """
+    Потоково читает элементы JSON-массива, не загружая файл целиком.
+    Разбор идёт по смещению в буфере; прочитанная часть отбрасывается один раз при подгрузке куска.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        need_more = False
+        if not started:
+            if position == len(buffer):
+                if eof:
+                    return
+                need_more = True
+            elif buffer[position] != "[":
+                raise ValueError("Ожидался JSON-массив")
+            else:
+                position += 1
+                started = True
+                continue
+        else:
+            if buffer.startswith(",", position):
+                position = _WHITESPACE.match(buffer, position + 1).end()
+            if buffer.startswith("]", position):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Элемент ещё не дочитан — подгружаем следующий кусок
+                need_more = True
+            else:
+                delimiter = _WHITESPACE.match(buffer, end).end()
+                if buffer[delimiter:delimiter + 1] in (",", "]"):
+                    yield item
+                    position = end
+                    continue
+                # Число на границе куска («12» из «123», «1.» из «1.5») может продолжаться в следующем куске
+                if eof:
+                    raise ValueError("Ожидалась запятая или конец JSON-массива")
+                need_more = True
+        if need_more:
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def iter_records(file_path):
+    """Генератор записей из JSON-массива или JSONL (по одной записи на строку)"""
+    with open(file_path, "r", encoding="utf-8") as file:
+        head = file.read(1)
+        while head and head.isspace():
+            head = file.read(1)
+        file.seek(0)
+        if head == "[":
+            records = iter_json_array(file)
+        else:
+            records = (json.loads(line) for line in file if line.strip())
+        for record in records:
+            if "options" in record:
+                continue
+            yield record
+
+
+def iter_batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkLoader:
+    """
+    Конвейерная загрузка больших корпусов: чтение и кодирование идут в одном потоке,
+    вставка в коллекцию — в другом, между ними ограниченная очередь,
+    поэтому в памяти одновременно находится не больше queue_size + 2 батчей.
+    flush выполняется один раз в конце.
+    """
+
+    def __init__(self, milvus_client, collection, batch_size=512, queue_size=4, upsert=False):
+        self.milvus_client = milvus_client
+        self.collection = collection
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.upsert = upsert
+
+    def _encode_worker(self, records, encoded, errors):
+        try:
+            for batch in iter_batches(records, self.batch_size):
+                if errors:
+                    break
+                embeddings = self.milvus_client.encode_documents(batch)
+                encoded.put((batch, embeddings))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            encoded.put(_DONE)
+
+    def _insert_worker(self, encoded, errors, stats):
+        while True:
+            item = encoded.get()
+            if item is _DONE:
+                return
+            if errors:
+                # Кодирование или вставка уже упали — просто разгружаем очередь
+                continue
+            batch, embeddings = item
+            try:
+                self.milvus_client.insert_qa_data(
+                    self.collection, batch, upsert=self.upsert, flush=False, embeddings=embeddings
+                )
+                stats["docs"] += len(batch)
+                stats["batches"] += 1
+            except Exception as e:
+                errors.append(e)
+
+    def run(self, records):
+        encoded = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        stats = {"docs": 0, "batches": 0}
+        start = time.perf_counter()
+
+        encoder = threading.Thread(target=self._encode_worker, args=(records, encoded, errors), daemon=True)
+        inserter = threading.Thread(target=self._insert_worker, args=(encoded, errors, stats), daemon=True)
+        encoder.start()
+        inserter.start()
+        while inserter.is_alive():
+            inserter.join(timeout=1.0)
+            if stats["docs"]:
+                elapsed = time.perf_counter() - start
+                print(f"Загружено {stats['docs']} записей ({stats['docs'] / elapsed:.1f} док/с)", end="\r")
+        encoder.join()
+        if errors:
+            raise errors[0]
+
+        self.collection.flush()
+        elapsed = time.perf_counter() - start
+        stats["seconds"] = elapsed
+        stats["docs_per_sec"] = stats["docs"] / elapsed if elapsed > 0 else 0.0
+        print(
+            f"\nЗагружено {stats['docs']} записей за {elapsed:.1f} с "
+            f"({stats['docs_per_sec']:.1f} док/с, батчей: {stats['batches']})"
+        )
+        return stats
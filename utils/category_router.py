@@ -0,0 +1,80 @@
+import os
+import numpy as np
+
+
+class CategoryRouter:
+    """
+    Маршрутизация запроса по категориям корпуса: центроид эмбеддингов фрагментов каждой категории
+    строится при загрузке данных, на запрос считается близость вектора запроса к центроидам.
+    Если одна или несколько категорий заметно ближе остальных, поиск ограничивается их разделами.
+    """
+
+    def __init__(self, categories, centroids, counts, fingerprint=None):
+        self.categories = list(categories)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, batches, fingerprint=None):
+        """batches — итерируемые пары (категории строк, векторы строк), центроиды копятся потоково"""
+        sums = {}
+        counts = {}
+        for categories, vectors in batches:
+            for category, vector in zip(categories, np.asarray(vectors, dtype=np.float32)):
+                if category in sums:
+                    sums[category] += vector
+                    counts[category] += 1
+                else:
+                    sums[category] = vector.copy()
+                    counts[category] = 1
+        categories = sorted(sums)
+        if not categories:
+            return cls([], np.empty((0, 0), dtype=np.float32), [], fingerprint)
+        centroids = np.stack([sums[category] for category in categories])
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        return cls(categories, centroids, [counts[category] for category in categories], fingerprint)
+
+    def route(self, query_embeddings, margin=0.05, max_categories=2):
+        """
+        Для каждого запроса — кортеж категорий, чья близость к запросу не дальше margin от лучшей,
+        или None (искать по всей коллекции), если таких категорий больше max_categories
+        """
+        if len(self.categories) < 2:
+            return [None for _ in query_embeddings]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        similarities = queries @ self.centroids.T
+        routes = []
+        for row in similarities:
+            close = np.flatnonzero(row >= row.max() - margin)
+            if len(close) > max_categories:
+                routes.append(None)
+            else:
+                routes.append(tuple(self.categories[i] for i in close[np.argsort(-row[close])]))
+        return routes
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            categories=np.asarray(self.categories, dtype=str),
+            centroids=self.centroids,
+            counts=self.counts,
+            fingerprint=np.asarray(self.fingerprint or "", dtype=str),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Загружает маршрутизатор с диска; None, если файла нет"""
+        if not os.path.exists(path):
+            return None
+        state = np.load(path)
+        return cls(
+            [str(category) for category in state["categories"]],
+            state["centroids"],
+            state["counts"],
+            fingerprint=str(state["fingerprint"]) or None
+        )
@@ -0,0 +1,146 @@
+import zlib
+import hashlib
+import numpy as np
+from utils.tokenization import NORMALIZE_RE, normalize_text
+
+SHINGLE_SIZE = 3
+# Простое число больше 2^32 для универсального хэширования (a * x + b) mod P
+MERSENNE_PRIME = np.uint64(4294967311)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Множество хэшей словесных n-грамм нормализованного текста (короткий текст — сами слова)"""
+    words = NORMALIZE_RE.findall(text.lower().replace("ё", "е"))
+    if len(words) < size:
+        grams = words
+    else:
+        grams = (" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return {zlib.crc32(gram.encode("utf-8")) for gram in grams}
+
+
+def text_key(text):
+    """Ключ текста после нормализации: совпадает только у текстов, отличающихся регистром, пунктуацией и пробелами"""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def unique_texts(texts):
+    """Тексты без повторов уже выбранных (после нормализации)"""
+    seen = set()
+    kept = []
+    for text in texts:
+        key = text_key(text)
+        if key not in seen:
+            seen.add(key)
+            kept.append(text)
+    return kept
+
+
+def unique_hits(hits):
+    """
+    Найденные записи без повторяющихся ответов: остаётся запись с более высоким местом.
+    Почти одинаковые ответы (другой специалист, другой раздел) не отбрасываются — это разные ответы.
+    """
+    seen = set()
+    kept = []
+    for hit in hits:
+        key = text_key(hit.entity.answer)
+        if key not in seen:
+            seen.add(key)
+            kept.append(hit)
+    return kept
+
+
+class DuplicateIndex:
+    """
+    Повторяющиеся ответы корпуса. Сворачиваются только записи с одинаковым после нормализации ответом:
+    запись становится псевдонимом первой записи с тем же ответом, вектор для неё не создаётся, её вопрос
+    ищется по канонической записи. Почти повторы (MinHash-подписи n-грамм ответа и LSH по полосам,
+    оценка коэффициента Жаккара не ниже threshold) с разными ответами остаются отдельными записями
+    со своими векторами и ответами и только учитываются в статистике.
+    threshold <= 0 отключает поиск: collapse возвращает записи без изменений.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._buckets = {}
+        self._signatures = {}
+        self._canonical_by_key = {}
+        self.canonical_of = {}
+        self.aliases = {}
+        self.near_duplicates = {}
+        self.records = 0
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def signature(self, text):
+        hashes = np.fromiter(shingles(text), dtype=np.uint64)
+        if not len(hashes):
+            hashes = np.zeros(1, dtype=np.uint64)
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, doc):
+        """Запоминает запись; возвращает id канонической записи, если ответ повторяет её ответ, иначе None"""
+        self.records += 1
+        key = text_key(doc["answer"])
+        canonical_id = self._canonical_by_key.get(key)
+        if canonical_id is not None:
+            self.canonical_of[doc["id"]] = canonical_id
+            self.aliases.setdefault(canonical_id, []).append(
+                {"id": doc["id"], "question": doc["question"], "url": doc.get("url", "")}
+            )
+            return canonical_id
+        self._canonical_by_key[key] = doc["id"]
+
+        signature = self.signature(doc["answer"])
+        keys = self._band_keys(signature)
+        similar = {
+            other_id
+            for band_key in keys
+            for other_id in self._buckets.get(band_key, ())
+            if np.mean(self._signatures[other_id] == signature) >= self.threshold
+        }
+        if similar:
+            self.near_duplicates[doc["id"]] = sorted(similar)
+        self._signatures[doc["id"]] = signature
+        for band_key in keys:
+            self._buckets.setdefault(band_key, []).append(doc["id"])
+        return None
+
+    @classmethod
+    def build(cls, records, threshold=0.8, **params):
+        index = cls(threshold, **params)
+        if index.enabled:
+            for doc in records:
+                index.add(doc)
+        return index
+
+    def collapse(self, records):
+        """Канонические записи с полем aliases (если у них есть псевдонимы); псевдонимы пропускаются"""
+        for doc in records:
+            if doc["id"] in self.canonical_of:
+                continue
+            aliases = self.aliases.get(doc["id"])
+            yield {**doc, "aliases": aliases} if aliases else doc
+
+    def stats(self):
+        removed = len(self.canonical_of)
+        return {
+            "records": self.records,
+            "canonical": self.records - removed,
+            "aliases": removed,
+            "near_duplicates": len(self.near_duplicates),
+            "reduction": removed / self.records if self.records else 0.0,
+        }
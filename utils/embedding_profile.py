@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import hashlib
+import numpy as np
+from pymilvus import DataType
+from utils.index_config import load_index_config
+
+# Готовые профили; любое поле можно переопределить переменными EMBEDDING_MODEL/DIM/DTYPE/PROJECTION
+PROFILE_PRESETS = {
+    "full": {},
+    "fp16": {"dtype": "float16"},
+    "int8": {"dtype": "int8"},
+    "pca512": {"dim": 512, "projection": "pca"},
+    "pca256": {"dim": 256, "projection": "pca"},
+    "pca256-fp16": {"dim": 256, "projection": "pca", "dtype": "float16"},
+    "pca256-int8": {"dim": 256, "projection": "pca", "dtype": "int8"},
+    "truncate512": {"dim": 512, "projection": "truncate"},
+    "small": {"model_name": "intfloat/multilingual-e5-small"},
+    "small-fp16": {"model_name": "intfloat/multilingual-e5-small", "dtype": "float16"},
+}
+
+DTYPES = ("float32", "float16", "int8")
+PROJECTIONS = ("none", "truncate", "pca")
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingProfile:
+    """
+    Профиль эмбеддингов: энкодер, размерность (усечение или PCA, обучаемая при загрузке данных)
+    и точность хранения (float32, float16 или int8). Схема коллекции, параметры индекса и поиска
+    следуют профилю. Для int8 в Milvus используется индекс IVF_SQ8 (int8-коды векторов),
+    в локальном хранилище векторы хранятся как int8. Параметры, подобранные tune_index.py (index_config),
+    заменяют значения по умолчанию.
+    """
+
+    def __init__(self, name="full", model_name='intfloat/multilingual-e5-large', dim=None,
+                 dtype="float32", projection="none", root="data/profiles", index_config=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Неизвестная точность эмбеддингов: {dtype}")
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Неизвестная проекция эмбеддингов: {projection}")
+        if projection != "none" and not dim:
+            raise ValueError("Для усечения и PCA нужно задать размерность")
+        self.name = name
+        self.model_name = model_name
+        self.dim = dim
+        self.dtype = dtype
+        self.projection = projection
+        self.index_config = index_config
+        self.path = os.path.join(root, re.sub(r"[^\w.-]+", "_", name))
+        self.mean = None
+        self.components = None
+        self._load_projection()
+
+    @classmethod
+    def from_env(cls, default_model_name='intfloat/multilingual-e5-large'):
+        name = os.getenv("EMBEDDING_PROFILE", "full")
+        if name not in PROFILE_PRESETS:
+            raise ValueError(f"Неизвестный EMBEDDING_PROFILE: {name}")
+        params = {"model_name": default_model_name, **PROFILE_PRESETS[name]}
+        if os.getenv("EMBEDDING_MODEL"):
+            params["model_name"] = os.getenv("EMBEDDING_MODEL")
+        if os.getenv("EMBEDDING_DIM"):
+            params["dim"] = int(os.getenv("EMBEDDING_DIM"))
+        if os.getenv("EMBEDDING_DTYPE"):
+            params["dtype"] = os.getenv("EMBEDDING_DTYPE")
+        if os.getenv("EMBEDDING_PROJECTION"):
+            params["projection"] = os.getenv("EMBEDDING_PROJECTION")
+        index_config = load_index_config(os.getenv("INDEX_CONFIG_PATH", "data/index_config.json"), name)
+        return cls(name=name, root=os.getenv("EMBEDDING_PROFILE_DIR", "data/profiles"), index_config=index_config, **params)
+
+    # --- проекция ---
+
+    @property
+    def projection_path(self):
+        return os.path.join(self.path, "pca.npz")
+
+    def _load_projection(self):
+        if self.projection == "pca" and os.path.exists(self.projection_path):
+            state = np.load(self.projection_path)
+            if state["components"].shape[0] == self.dim:
+                self.mean = state["mean"]
+                self.components = state["components"]
+
+    @property
+    def needs_fit(self):
+        return self.projection == "pca" and self.components is None
+
+    def fit(self, vectors):
+        """Обучает PCA на эмбеддингах документов и сохраняет проекцию рядом с данными"""
+        if self.projection != "pca":
+            return
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if len(vectors) < self.dim:
+            raise ValueError(
+                f"Для PCA до {self.dim} измерений нужно не меньше {self.dim} документов, получено {len(vectors)}"
+            )
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        self.mean = mean.astype(np.float32)
+        self.components = vt[:self.dim].astype(np.float32)
+        os.makedirs(self.path, exist_ok=True)
+        np.savez(self.projection_path, mean=self.mean, components=self.components)
+        print(f"PCA-проекция {vectors.shape[1]} -> {self.dim} обучена на {len(vectors)} документах")
+
+    def project(self, vectors):
+        """Эмбеддинги модели -> нормированные float32 векторы размерности профиля"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        single = vectors.ndim == 1
+        if single:
+            vectors = vectors[None, :]
+        vectors = _normalize(vectors)
+        if self.projection == "truncate":
+            vectors = _normalize(vectors[:, :self.dim])
+        elif self.projection == "pca":
+            if self.components is None:
+                raise ValueError(f"PCA-проекция профиля '{self.name}' ещё не обучена — загрузите данные")
+            vectors = _normalize((vectors - self.mean) @ self.components.T)
+        return vectors[0] if single else vectors
+
+    def quantize(self, vectors):
+        """Округление до точности хранения (для оценки полноты без базы)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "float16":
+            return vectors.astype(np.float16).astype(np.float32)
+        if self.dtype == "int8":
+            scale = 127 / np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12)
+            codes = np.clip(np.round(vectors * scale), -127, 127)
+            return _normalize(codes.astype(np.float32))
+        return vectors
+
+    # --- хранилище ---
+
+    def output_dim(self, native_dim):
+        return self.dim or native_dim
+
+    @property
+    def vector_data_type(self):
+        return DataType.FLOAT16_VECTOR if self.dtype == "float16" else DataType.FLOAT_VECTOR
+
+    def to_storage(self, vectors):
+        """Векторы в формате, который ожидает поле коллекции"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "float16":
+            return list(vectors.astype(np.float16))
+        return vectors.tolist()
+
+    def index_params(self):
+        if self.index_config:
+            return {"metric_type": "COSINE", **self.index_config["index_params"]}
+        if self.dtype == "int8":
+            return {"metric_type": "COSINE", "index_type": "IVF_SQ8", "params": {"nlist": 128}}
+        return {
+            "metric_type": "COSINE",  # Лучше для текстовых данных
+            "index_type": "HNSW",
+            "params": {
+                "M": 32,               # Увеличили с 16 до 32 для лучшей точности
+                "efConstruction": 500  # Увеличили с 256 до 500 для лучшего качества индекса
+            }
+        }
+
+    def search_params(self, limit=None):
+        """Параметры поиска; для HNSW ef не меньше limit — Milvus отклоняет запрос с ef < limit"""
+        if self.index_config:
+            params = dict(self.index_config["search_params"])
+        elif self.dtype == "int8":
+            params = {"nprobe": 16}
+        else:
+            params = {"ef": 128}
+        if limit and "ef" in params:
+            params["ef"] = max(params["ef"], limit)
+        return {"metric_type": "COSINE", "params": params}
+
+    @property
+    def signature(self):
+        """Отпечаток профиля: при его смене коллекция пересоздаётся"""
+        payload = {
+            "model_name": self.model_name,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "projection": self.projection,
+        }
+        if self.components is not None:
+            payload["pca"] = hashlib.sha256(self.components.tobytes()).hexdigest()[:16]
+        digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{self.name}:{digest[:16]}"
+
+    def bytes_per_vector(self, native_dim):
+        return self.output_dim(native_dim) * {"float32": 4, "float16": 2, "int8": 1}[self.dtype]
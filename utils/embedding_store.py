@@ -0,0 +1,116 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Дисковый кэш эмбеддингов документов.
+    Векторы лежат в memory-mapped файле float32, рядом — индекс ключей (по строке на вектор).
+    Ключ — хэш от (имя модели, точный текст документа), поэтому пересборка коллекции,
+    миграция схемы или эксперименты с индексом не требуют повторного прогона энкодера.
+    """
+
+    def __init__(self, model_name, root="data/embeddings"):
+        self.model_name = model_name
+        self.path = os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.keys_path = os.path.join(self.path, "keys.txt")
+        self.meta_path = os.path.join(self.path, "meta.json")
+        self.dim = None
+        self.index = {}
+        self._vectors = None
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Загружает индекс ключей и отбрасывает хвост, недописанный при аварийном завершении"""
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as file:
+            self.dim = json.load(file)["dim"]
+
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r", encoding="utf-8") as file:
+                keys = [line.strip() for line in file if line.strip()]
+
+        row_size = self.dim * 4
+        vector_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = min(len(keys), vector_bytes // row_size)
+        if rows != len(keys) or rows * row_size != vector_bytes:
+            # Векторы пишутся раньше ключей: выравниваем оба файла по числу целых строк
+            keys = keys[:rows]
+            with open(self.vectors_path, "ab") as file:
+                file.truncate(rows * row_size)
+            with open(self.keys_path, "w", encoding="utf-8") as file:
+                file.writelines(f"{key}\n" for key in keys)
+
+        self.index = {key: row for row, key in enumerate(keys)}
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, text):
+        return self.key(text) in self.index
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            if not self.index:
+                return np.empty((0, self.dim or 0), dtype=np.float32)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.index), self.dim))
+        return self._vectors
+
+    def add(self, keys, vectors):
+        """Дописывает новые векторы в конец хранилища"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as file:
+                    json.dump({"model_name": self.model_name, "dim": self.dim}, file)
+            # Повтор ключа внутри одного вызова записывается один раз (первое вхождение), иначе строки
+            # файла векторов разошлись бы с номерами строк в индексе
+            new_rows = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self.index and key not in new_rows:
+                    new_rows[key] = vector
+            new_rows = list(new_rows.items())
+            if not new_rows:
+                return
+            with open(self.vectors_path, "ab") as file:
+                file.write(np.stack([vector for _, vector in new_rows]).tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as file:
+                for key, _ in new_rows:
+                    self.index[key] = len(self.index)
+                    file.write(f"{key}\n")
+            self._vectors = None
+
+    def get(self, texts):
+        """Возвращает векторы для текстов; None, если хотя бы одного нет в хранилище"""
+        keys = [self.key(text) for text in texts]
+        if any(key not in self.index for key in keys):
+            return None
+        return np.asarray(self.vectors[[self.index[key] for key in keys]])
+
+    def encode(self, model, texts, batch_size=64):
+        """Кодирует тексты, прогоняя через модель только отсутствующие в хранилище"""
+        keys = [self.key(text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.index and key not in missing:
+                missing[key] = text
+        if missing:
+            encoded = model.encode(list(missing.values()), batch_size=batch_size)
+            self.add(list(missing.keys()), encoded)
+        if not keys:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self.vectors[[self.index[key] for key in keys]])
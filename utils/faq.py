@@ -0,0 +1,95 @@
+import time
+import threading
+from utils.hits import QAHit
+from utils.tokenization import normalize_text
+from utils.metrics import metrics
+
+# Пути ответа: дословный вопрос из базы, почти совпадающий вопрос, семантический кэш, полный конвейер с QA-моделью
+ANSWER_PATHS = ("exact", "similar", "cache", "model")
+
+
+class FaqFastPath:
+    """
+    Быстрый путь для вопросов из базы: ответ берётся из записи без фильтрации и QA-модели, если
+    нормализованный запрос совпадает с вопросом записи (хэш-индекс) или косинусная близость
+    лучшего найденного фрагмента не ниже min_score. Считает долю трафика и время по каждому пути.
+    """
+
+    def __init__(self, min_score=0.93, enabled=True):
+        self.min_score = min_score
+        self.enabled = enabled
+        self._questions = {}
+        self._source = None
+        self._lock = threading.Lock()
+        self.counts = {path: 0 for path in ANSWER_PATHS}
+        self.seconds = {path: 0.0 for path in ANSWER_PATHS}
+
+    def _index(self, lexical_index):
+        """Хэш-индекс нормализованных вопросов, перестраивается при смене лексического индекса"""
+        if lexical_index is not self._source:
+            questions = {}
+            for doc_id, doc in zip(lexical_index.ids, lexical_index.documents):
+                hit = QAHit(int(doc_id), 1.0, doc)
+                questions.setdefault(normalize_text(doc["question"]), hit)
+                # Вопрос свёрнутой записи с тем же ответом ведёт к ответу канонической записи под своим id и ссылкой
+                for alias in doc.get("aliases") or []:
+                    questions.setdefault(
+                        normalize_text(alias["question"]),
+                        QAHit(int(alias["id"]), 1.0, {**doc, **alias, "aliases": []})
+                    )
+            with self._lock:
+                self._questions = questions
+                self._source = lexical_index
+        return self._questions
+
+    def exact(self, query, lexical_index):
+        """Запись, вопрос которой совпадает с запросом после нормализации, или None"""
+        if not self.enabled or lexical_index is None:
+            return None
+        return self._index(lexical_index).get(normalize_text(query))
+
+    def similar(self, hits):
+        """
+        Лучшая запись, если её близость к запросу не ниже порога, иначе None.
+        Учитываются только записи из плотного поиска (с найденными фрагментами): у них distance — косинус.
+        """
+        if not self.enabled or not hits:
+            return None
+        top = hits[0]
+        if top.entity.get("passages") is None or top.distance < self.min_score:
+            return None
+        return top
+
+    def record(self, path, started):
+        elapsed = time.perf_counter() - started
+        metrics.count("answers", path=path)
+        with self._lock:
+            self.counts[path] += 1
+            self.seconds[path] += elapsed
+
+    def serve(self, path, hit, started):
+        """Ответ быстрого пути: сохранённый ответ записи и сама запись"""
+        self.record(path, started)
+        return hit.entity.answer, [hit]
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            seconds = dict(self.seconds)
+        total = sum(counts.values())
+        mean_ms = {path: 1000 * seconds[path] / counts[path] if counts[path] else None for path in ANSWER_PATHS}
+        fast = counts["exact"] + counts["similar"]
+        saved_ms = 0.0
+        if mean_ms["model"] is not None:
+            # Экономия оценивается по средней задержке полного конвейера за то же время работы
+            saved_ms = sum(
+                counts[path] * (mean_ms["model"] - mean_ms[path])
+                for path in ("exact", "similar") if counts[path]
+            )
+        return {
+            "requests": total,
+            "counts": counts,
+            "fast_path_fraction": fast / total if total else 0.0,
+            "mean_latency_ms": mean_ms,
+            "latency_saved_ms": saved_ms,
+        }
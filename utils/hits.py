@@ -0,0 +1,47 @@
+class HitEntity:
+    """Поля найденного документа с доступом как у pymilvus: entity.question, entity.get("question")"""
+
+    def __init__(self, fields):
+        self._fields = dict(fields)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def get(self, name, default=None):
+        return self._fields.get(name, default)
+
+    def to_dict(self):
+        return dict(self._fields)
+
+
+class QAHit:
+    """Результат поиска, совместимый с pymilvus Hit (id, distance, score, entity)"""
+
+    def __init__(self, id, distance, fields):
+        self.id = id
+        self.distance = distance
+        self.entity = HitEntity(fields)
+
+    @property
+    def score(self):
+        return self.distance
+
+    def __repr__(self):
+        return f"QAHit(id={self.id}, distance={self.distance:.4f})"
+
+
+HIT_FIELDS = ("question", "answer", "url", "category")
+
+
+def hit_to_dict(hit):
+    """Сериализация результата поиска (pymilvus Hit или QAHit) для JSON-ответов"""
+    return {
+        "id": hit.id,
+        "score": hit.distance,
+        **{field: getattr(hit.entity, field, None) for field in HIT_FIELDS},
+    }
@@ -0,0 +1,50 @@
+import os
+import json
+from datetime import datetime, timezone
+
+# Типы индексов, которые перебирает tune_index.py (те же имена, что в Milvus)
+INDEX_TYPES = ("HNSW", "IVF_FLAT", "IVF_SQ8")
+
+
+def load_index_config(path, profile_name):
+    """
+    Параметры индекса и поиска, подобранные tune_index.py для профиля эмбеддингов,
+    или None, если файла нет или профиль не настраивался
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        config = json.load(file)
+    return config.get("profiles", {}).get(profile_name)
+
+
+def save_index_config(path, profile_name, index_params, search_params, measured=None):
+    """Записывает выбранные параметры профиля, не трогая настройки других профилей"""
+    config = {"profiles": {}}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            config = json.load(file)
+    config.setdefault("profiles", {})[profile_name] = {
+        "index_params": index_params,
+        "search_params": search_params,
+        "measured": measured or {},
+        "tuned_at": datetime.now(timezone.utc).isoformat(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(config, file, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def same_index(current, desired):
+    """Совпадают ли тип, метрика и параметры построенного индекса с нужными (Milvus может вернуть числа строками)"""
+    def normalized(index_params):
+        params = index_params.get("params") or {}
+        if isinstance(params, str):
+            params = json.loads(params)
+        return (
+            index_params.get("index_type"),
+            index_params.get("metric_type"),
+            {key: str(value) for key, value in params.items()},
+        )
+    return normalized(current or {}) == normalized(desired)
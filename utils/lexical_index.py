@@ -0,0 +1,188 @@
+import os
+import pickle
+import numpy as np
+from scipy import sparse
+from utils.tokenization import tokenize
+from utils.hits import QAHit
+
+DOCUMENT_FIELDS = ("question", "answer", "url", "category")
+# Увеличивается при изменении формата файла: индекс старого формата перестраивается
+FORMAT_VERSION = 4
+
+
+def document_text(doc):
+    # Вопросы почти повторяющихся записей, свёрнутых в эту запись, тоже находятся лексическим поиском
+    aliases = " ".join(alias["question"] for alias in doc.get("aliases") or [])
+    return f"{doc['question']} {aliases} {doc['answer']}" if aliases else f"{doc['question']} {doc['answer']}"
+
+
+class LexicalIndex:
+    """
+    Лексический индекс BM25 по вопросу и ответу всего корпуса.
+    Строится один раз при загрузке данных и сохраняется рядом с ними;
+    на запрос считается только вектор запроса и разреженное скалярное произведение.
+    Поля документов хранятся вместе с индексом, поэтому он может сам выступать
+    локальным поисковиком (инвертированный индекс в столбцах матрицы).
+    """
+
+    def __init__(self, vectorizer, matrix, idf, avgdl, ids, documents, fingerprint=None, k1=1.5, b=0.75,
+                 lowered_answers=None):
+        self.vectorizer = vectorizer
+        self.matrix = matrix.tocsr()
+        self.idf = idf
+        self.avgdl = avgdl
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.row_by_id = {int(doc_id): row for row, doc_id in enumerate(self.ids)}
+        self.documents = documents
+        # Ответы в нижнем регистре для проверки вхождения слов запроса без обработки текста на запрос
+        self.lowered_answers = lowered_answers or [doc["answer"].lower() for doc in documents]
+        self._inverted = None
+        self.fingerprint = fingerprint
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, records, fingerprint=None, k1=1.5, b=0.75):
+        """Строит индекс из итерируемого набора записей за один проход"""
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        ids = []
+        documents = []
+
+        def texts():
+            for doc in records:
+                ids.append(doc["id"])
+                document = {field: doc.get(field, "") for field in DOCUMENT_FIELDS}
+                if doc.get("aliases"):
+                    document["aliases"] = doc["aliases"]
+                documents.append(document)
+                yield document_text(doc)
+
+        vectorizer = CountVectorizer(analyzer=tokenize)
+        counts = vectorizer.fit_transform(texts()).tocsr().astype(np.float32)
+        matrix, idf, avgdl = cls._bm25_weights(counts, k1, b)
+        return cls(vectorizer, matrix, idf, avgdl, ids, documents, fingerprint=fingerprint, k1=k1, b=b)
+
+    @staticmethod
+    def _bm25_weights(counts, k1, b, idf=None, avgdl=None):
+        """Переводит матрицу частот термов в веса BM25 (idf * насыщенная частота)"""
+        n_docs = counts.shape[0]
+        doc_lengths = np.asarray(counts.sum(axis=1)).ravel()
+        if avgdl is None:
+            avgdl = doc_lengths.mean() if n_docs else 0.0
+        if idf is None:
+            df = np.bincount(counts.indices, minlength=counts.shape[1])
+            idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        weights = counts.copy()
+        row_norm = k1 * (1 - b + b * doc_lengths / max(avgdl, 1e-9))
+        rows = np.repeat(np.arange(n_docs), np.diff(weights.indptr))
+        tf = weights.data
+        weights.data = idf[weights.indices] * tf * (k1 + 1) / (tf + row_norm[rows])
+        return weights, idf, avgdl
+
+    def query_vector(self, query):
+        """Бинарный вектор термов запроса в словаре корпуса"""
+        vector = self.vectorizer.transform([query]).tocsr()
+        vector.data[:] = 1.0
+        return vector.astype(np.float32)
+
+    def score(self, query, ids, texts=None):
+        """
+        Оценки BM25 запроса для документов с указанными id.
+        Документы, которых нет в индексе, оцениваются по переданному тексту
+        с idf корпуса (на случай, если индекс отстаёт от коллекции).
+        """
+        query_vector = self.query_vector(query).T
+        scores = np.zeros(len(ids), dtype=np.float32)
+        known = [(i, self.row_by_id[doc_id]) for i, doc_id in enumerate(ids) if doc_id in self.row_by_id]
+        if known:
+            positions, rows = zip(*known)
+            scores[list(positions)] = (self.matrix[list(rows)] @ query_vector).toarray().ravel()
+        unknown = [i for i, doc_id in enumerate(ids) if doc_id not in self.row_by_id]
+        if unknown and texts is not None:
+            counts = self.vectorizer.transform([texts[i] for i in unknown]).tocsr().astype(np.float32)
+            weights, _, _ = self._bm25_weights(counts, self.k1, self.b, idf=self.idf, avgdl=self.avgdl)
+            scores[unknown] = (weights @ query_vector).toarray().ravel()
+        return scores
+
+    def lowered_answer(self, doc_id):
+        row = self.row_by_id.get(doc_id)
+        return self.lowered_answers[row] if row is not None else None
+
+    @property
+    def inverted(self):
+        """Матрица в формате CSC: для каждого терма — список документов с весами (инвертированный индекс)"""
+        if self._inverted is None:
+            self._inverted = self.matrix.tocsc()
+        return self._inverted
+
+    def _top_hits(self, rows, scores, k):
+        """top-k строк с положительной оценкой (rows по возрастанию) в порядке убывания оценки"""
+        positive = scores > 0
+        rows, scores = rows[positive], scores[positive]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [QAHit(int(self.ids[row]), float(score), self.documents[row]) for row, score in zip(rows[order], scores[order])]
+
+    def search(self, query, k=5):
+        """Поиск top-k документов по BM25; возвращает QAHit в порядке убывания оценки"""
+        term_ids = self.query_vector(query).indices
+        if not len(term_ids) or not len(self.ids):
+            return []
+        scores = np.asarray(self.inverted[:, term_ids].sum(axis=1)).ravel()
+        return self._top_hits(np.arange(len(scores)), scores, k)
+
+    def search_batch(self, queries, k=5):
+        """search для нескольких запросов: оценки всех запросов — одно произведение разреженных матриц"""
+        if not len(self.ids):
+            return [[] for _ in queries]
+        query_matrix = self.vectorizer.transform(list(queries)).tocsr().astype(np.float32)
+        query_matrix.data[:] = 1.0
+        scores = (query_matrix @ self.matrix.T).tocsr()
+        scores.sort_indices()
+        return [
+            self._top_hits(
+                scores.indices[scores.indptr[i]:scores.indptr[i + 1]],
+                scores.data[scores.indptr[i]:scores.indptr[i + 1]],
+                k
+            )
+            for i in range(scores.shape[0])
+        ]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump({
+                "format_version": FORMAT_VERSION,
+                "vectorizer": self.vectorizer,
+                "matrix": self.matrix,
+                "idf": self.idf,
+                "avgdl": self.avgdl,
+                "ids": self.ids,
+                "documents": self.documents,
+                "lowered_answers": self.lowered_answers,
+                "fingerprint": self.fingerprint,
+                "k1": self.k1,
+                "b": self.b,
+            }, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Загружает индекс с диска; None, если файла нет или он старого формата"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+        if state.get("format_version") != FORMAT_VERSION:
+            return None
+        return cls(
+            state["vectorizer"], sparse.csr_matrix(state["matrix"]), state["idf"], state["avgdl"], state["ids"],
+            state["documents"], fingerprint=state["fingerprint"], k1=state["k1"], b=state["b"],
+            lowered_answers=state["lowered_answers"]
+        )
+
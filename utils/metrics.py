@@ -0,0 +1,212 @@
+import os
+import time
+import functools
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки этапов, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Этапы конвейера search_and_generate
+STAGES = (
+    "request", "query_encode", "vector_search", "sparse_search", "lexical_scoring", "filtering",
+    "context_build", "qa_tokenize", "qa_forward", "fallback",
+)
+
+_current_trace = contextvars.ContextVar("langfuse_trace", default=None)
+
+
+class _NullSpan:
+    """Этап без замера: общий объект, ничего не делает"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        trace = _current_trace.get()
+        if trace is not None:
+            try:
+                trace.span(
+                    name=self.stage, start_time=self.started_at, end_time=datetime.now(timezone.utc),
+                    level="ERROR" if exc_type else "DEFAULT"
+                )
+            except Exception as e:
+                logger.warning("Не удалось записать этап %s в Langfuse: %s", self.stage, e)
+        return False
+
+
+class _Trace:
+    """Трассировка запроса в Langfuse: этапы внутри неё записываются как вложенные span"""
+
+    def __init__(self, langfuse, name, payload):
+        self.langfuse = langfuse
+        self.name = name
+        self.payload = payload
+        self.trace = None
+        self._token = None
+
+    def __enter__(self):
+        try:
+            self.trace = self.langfuse.trace(name=self.name, input=self.payload)
+            self._token = _current_trace.set(self.trace)
+        except Exception as e:
+            logger.warning("Не удалось создать трассировку Langfuse: %s", e)
+        return self
+
+    def update(self, **fields):
+        if self.trace is not None:
+            try:
+                self.trace.update(**fields)
+            except Exception as e:
+                logger.warning("Не удалось обновить трассировку Langfuse: %s", e)
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self._token is not None:
+            _current_trace.reset(self._token)
+        return False
+
+
+class _NullTrace(_NullSpan):
+    def update(self, **fields):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Metrics:
+    """
+    Задержки этапов конвейера (гистограммы) и счётчики в формате Prometheus,
+    плюс необязательные трассировки Langfuse. В выключенном состоянии span() и trace()
+    возвращают общий пустой объект и ничего не считают.
+    """
+
+    def __init__(self, enabled=True, langfuse=None, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.langfuse = langfuse
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @classmethod
+    def from_env(cls):
+        """METRICS_ENABLED=0 — без замеров; LANGFUSE_ENABLED=1 — трассировки (ключи LANGFUSE_* как в SDK)"""
+        langfuse = None
+        if os.getenv("LANGFUSE_ENABLED", "0") == "1":
+            try:
+                from langfuse import Langfuse
+                langfuse = Langfuse()
+            except Exception as e:
+                logger.warning("Langfuse недоступен, трассировки отключены: %s", e)
+        return cls(enabled=os.getenv("METRICS_ENABLED", "1") == "1" or langfuse is not None, langfuse=langfuse)
+
+    def span(self, stage):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, stage)
+
+    def timed(self, stage):
+        """Декоратор: каждый вызов функции — замер этапа stage"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def trace(self, name, **payload):
+        if self.langfuse is None:
+            return NULL_TRACE
+        return _Trace(self.langfuse, name, payload)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self):
+        """Сводка для JSON: число замеров, среднее и сумма по этапам, значения счётчиков"""
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": histogram["count"],
+                    "sum_s": histogram["sum"],
+                    "mean_ms": 1000 * histogram["sum"] / histogram["count"] if histogram["count"] else 0.0,
+                }
+                for stage, histogram in self._histograms.items()
+            }
+            counters = {
+                name + "".join(f"[{key}={value}]" for key, value in labels): value
+                for (name, labels), value in self._counters.items()
+            }
+        return {"stages": stages, "counters": counters}
+
+    def render_prometheus(self):
+        """Текстовый формат Prometheus: rag_stage_seconds (гистограмма по этапам) и rag_*_total"""
+        lines = [
+            "# HELP rag_stage_seconds Длительность этапа конвейера",
+            "# TYPE rag_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    cumulative += count
+                    lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+                lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                lines.append(f"# TYPE rag_{name}_total counter")
+                for (counter_name, labels), value in sorted(self._counters.items()):
+                    if counter_name != name:
+                        continue
+                    label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+                    lines.append(f"rag_{name}_total{{{label_text}}} {value}" if label_text else f"rag_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        if self.langfuse is not None:
+            self.langfuse.flush()
+
+
+metrics = Metrics.from_env()
@@ -1,109 +1,616 @@
-from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForQuestionAnswering
-import torch
+from pymilvus import FieldSchema, DataType
+import numpy as np
 import os
 import json
-import re
+import hashlib
+import itertools
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from tqdm import tqdm
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from utils.prompts import MedicalPromptManager
+from utils.embedding_store import EmbeddingStore
+from utils.token_store import TokenStore
+from utils.lexical_index import LexicalIndex
+from utils.vector_store import create_vector_backend
+from utils.query_cache import QueryEmbeddingCache
+from utils.answer_cache import SemanticAnswerCache
+from utils import model_registry
+from utils.qa_inference import extract_best_spans
+from utils.passages import iter_passages, split_passages, passage_text, qa_context
+from utils.hits import QAHit
+from utils.embedding_profile import EmbeddingProfile
+from utils.category_router import CategoryRouter
+from utils.query_matcher import matcher
+from utils.faq import FaqFastPath
+from utils.metrics import metrics
+from utils.index_config import same_index
+from utils.worker_pool import InferencePool
+from utils.dedup import DuplicateIndex, unique_hits, unique_texts
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+HASHED_FIELDS = ("question", "answer", "url", "category")
+
+
+def record_hash(doc):
+    """Хэш содержимого записи: меняется только при изменении полей, попадающих в коллекцию, и её псевдонимов"""
+    content = {field: doc[field] for field in HASHED_FIELDS}
+    if doc.get("aliases"):
+        content["aliases"] = doc["aliases"]
+    payload = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def corpus_fingerprint(hashes):
+    """Отпечаток корпуса по последовательности хэшей записей"""
+    digest = hashlib.sha256()
+    for content_hash in hashes:
+        digest.update(content_hash.encode("ascii"))
+    return digest.hexdigest()
+
+
 class MilvusClient:
     def __init__(self):
         self.host = os.getenv("MILVUS_HOST", "standalone")
         self.port = os.getenv("MILVUS_PORT", "19530")
         self.qa_collection_name = "medical_qa"
-        self.embedding_model = SentenceTransformer('intfloat/multilingual-e5-large')
-        self.qa_model_name = "Den4ikAI/rubert_large_squad_2"
-        self.qa_tokenizer = AutoTokenizer.from_pretrained(self.qa_model_name)
-        self.qa_model = AutoModelForQuestionAnswering.from_pretrained(self.qa_model_name)
-        self.vectorizer = TfidfVectorizer()
-        self.prompt_manager = MedicalPromptManager()
+        # VECTOR_BACKEND=local — хранилище в процессе (NumPy/FAISS) вместо сервера Milvus
+        self.vector_backend = create_vector_backend(self.host, self.port)
+        # EMBEDDING_PROFILE — энкодер, размерность и точность хранения векторов
+        self.embedding_profile = EmbeddingProfile.from_env(model_registry.EMBEDDING_MODEL_NAME)
+        self.embedding_model_name = self.embedding_profile.model_name
+        self.qa_model_name = model_registry.QA_MODEL_NAME
+        # QA_BACKEND=torch (fp32), int8 (динамическая квантизация) или onnx (ONNX Runtime)
+        self.qa_backend = os.getenv("QA_BACKEND", "torch")
+        # Модели общие для всех клиентов процесса и загружаются при первом обращении или в фоне
+        model_registry.start_model_loading([
+            ("embedding", self.embedding_model_name),
+            ("qa_tokenizer", self.qa_model_name),
+            (model_registry.qa_model_kind(self.qa_backend), self.qa_model_name),
+        ])
+        self.embedding_store = EmbeddingStore(
+            self.embedding_model_name,
+            root=os.getenv("EMBEDDING_CACHE_DIR", "data/embeddings")
+        )
+        # QUERY_CACHE_SIZE=0 отключает кэш, QUERY_CACHE_PATH включает дисковый уровень
+        self.query_cache = QueryEmbeddingCache(
+            self.embedding_model_name,
+            max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            path=os.getenv("QUERY_CACHE_PATH") or None
+        )
+        # Токены QA-токенизатора для фрагментов корпуса, считаются при загрузке данных
+        self.token_store = TokenStore(self.qa_model_name, root=os.getenv("TOKEN_STORE_DIR", "data/tokens"))
+        self.lexical_index_path = os.getenv("LEXICAL_INDEX_PATH", "data/lexical_index.pkl")
+        self.lexical_index = LexicalIndex.load(self.lexical_index_path)
+        self._lexical_index_mtime = self._lexical_index_file_mtime()
+        # ANSWER_CACHE_SIZE=0 отключает семантический кэш ответов
+        self.answer_cache = SemanticAnswerCache(
+            max_size=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+            max_distance=float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.03"))
+        )
+        # Вопросы из базы отвечаются сохранённым ответом без QA-модели; FAQ_FAST_PATH=0 отключает
+        self.faq = FaqFastPath(
+            min_score=float(os.getenv("FAQ_MIN_SCORE", "0.93")),
+            enabled=os.getenv("FAQ_FAST_PATH", "1") == "1"
+        )
+        # Ответы делятся на фрагменты при загрузке, в коллекции индексируется каждый фрагмент
+        self.passage_max_chars = int(os.getenv("PASSAGE_MAX_CHARS", "800"))
+        self.passage_overfetch = int(os.getenv("PASSAGE_OVERFETCH", "3"))
+        # Окна QA-модели: длина, перекрытие и число окон в одном прямом проходе
+        self.qa_max_length = int(os.getenv("QA_MAX_LENGTH", "384"))
+        self.qa_stride = int(os.getenv("QA_STRIDE", "128"))
+        self.qa_batch_size = int(os.getenv("QA_BATCH_SIZE", "16"))
+        # Максимальная длина ответа в токенах и порог уверенности, ниже которого ответ считается ненайденным
+        self.qa_max_answer_tokens = int(os.getenv("QA_MAX_ANSWER_TOKENS", "64"))
+        self.qa_min_confidence = float(os.getenv("QA_MIN_CONFIDENCE", "0"))
+        # RETRIEVAL_MODE=hybrid — плотный поиск в Milvus параллельно с BM25 и слияние списков (RRF)
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "dense")
+        self.hybrid_dense_weight = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+        self.hybrid_sparse_weight = float(os.getenv("HYBRID_SPARSE_WEIGHT", "1.0"))
+        self.hybrid_rrf_k = int(os.getenv("HYBRID_RRF_K", "60"))
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "20"))
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+        # SEARCH_ROUTING=category — плотный поиск только в разделах категорий, ближайших к запросу
+        self.search_routing = os.getenv("SEARCH_ROUTING", "none")
+        self.routing_margin = float(os.getenv("ROUTING_MARGIN", "0.05"))
+        self.routing_max_categories = int(os.getenv("ROUTING_MAX_CATEGORIES", "2"))
+        self.category_router_path = os.getenv("CATEGORY_ROUTER_PATH", "data/category_router.npz")
+        self.category_router = CategoryRouter.load(self.category_router_path)
+        self.routing_stats = {"routed": 0, "fallback": 0, "full": 0}
+        # DEDUP_THRESHOLD > 0 — записи с одинаковыми ответами сворачиваются при загрузке и убираются из результатов,
+        # почти повторы с порогом сходства MinHash/Жаккар только учитываются; 0 (по умолчанию) — отключено
+        self.dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", "0"))
+        # Пул процессов для энкодера и QA-модели (start_inference_pool), иначе вывод в этом процессе
+        self.inference_pool = None
         self.connect()
 
+    @property
+    def embedding_model(self):
+        return model_registry.get_embedding_model(self.embedding_model_name)
+
+    @property
+    def qa_tokenizer(self):
+        return model_registry.get_qa_tokenizer(self.qa_model_name)
+
+    @property
+    def qa_model(self):
+        return model_registry.get_qa_model(self.qa_model_name, self.qa_backend)
+
     def connect(self):
-        print("Подключение к Milvus...")
-        connections.connect("default", host=self.host, port=self.port)
+        self.vector_backend.connect()
+
+    def start_inference_pool(self, workers, threads_per_worker=None):
+        """Переводит энкодер запросов и QA-модель в пул из workers процессов с общими весами"""
+        if self.inference_pool is None:
+            self.inference_pool = InferencePool(self, workers, threads_per_worker).start()
+        return self.inference_pool
+
+    def stop_inference_pool(self):
+        if self.inference_pool is not None:
+            self.inference_pool.stop()
+            self.inference_pool = None
+
+    def encode_queries(self, texts):
+        """Прямой проход энкодера по текстам запросов — в пуле процессов, если он запущен"""
+        if self.inference_pool is not None:
+            return self.inference_pool.encode(texts)
+        return self.embedding_model.encode(texts)
 
     def load_data(self, file_path="data/medical_data.json"):
         with open(file_path, "r", encoding="utf-8") as file:
             return json.load(file)
 
+    def collection_description(self):
+        return (
+            f"Medical QA collection [profile={self.embedding_profile.signature}; "
+            f"passages={self.passage_max_chars}]"
+        )
+
     def create_qa_collection(self):
-        if utility.has_collection(self.qa_collection_name):
-            utility.drop_collection(self.qa_collection_name)
+        self.vector_backend.drop_collection(self.qa_collection_name)
+        profile = self.embedding_profile
+        dim = profile.output_dim(self.embedding_model.get_sentence_embedding_dimension())
         fields = [
             FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
-            FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=1024),
+            FieldSchema(name="doc_id", dtype=DataType.INT64),
+            FieldSchema(name="vector", dtype=profile.vector_data_type, dim=dim),
+            FieldSchema(name="passage", dtype=DataType.VARCHAR, max_length=2000),
             FieldSchema(name="question", dtype=DataType.VARCHAR, max_length=500),
             FieldSchema(name="answer", dtype=DataType.VARCHAR, max_length=2000),
             FieldSchema(name="url", dtype=DataType.VARCHAR, max_length=200),
-            FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=100),
+            # Ключ разделов: записи одной категории лежат в одном разделе, поиск с фильтром по категории их не покидает
+            FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=100, is_partition_key=True),
+            FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64),
         ]
-        schema = CollectionSchema(fields, description="Medical QA collection")
-        collection = Collection(self.qa_collection_name, schema)
-        return collection
-
-    def insert_qa_data(self, collection, data):
-        ids = [doc["id"] for doc in data]
-        questions = [doc["question"] for doc in data]
-        answers = [doc["answer"] for doc in data]
-        urls = [doc["url"] for doc in data]
-        categories = [doc["category"] for doc in data]
-        texts = [f"Вопрос: {q} Ответ: {a}" for q, a in zip(questions, answers)]
-        embeddings = self.embedding_model.encode(texts).tolist()
-        collection.insert([
+        return self.vector_backend.create_collection(
+            self.qa_collection_name, fields, description=self.collection_description()
+        )
+
+    def get_qa_collection(self):
+        """Возвращает существующую коллекцию или создаёт новую, если схема устарела"""
+        if self.vector_backend.has_collection(self.qa_collection_name):
+            collection = self.vector_backend.get_collection(self.qa_collection_name)
+            field_names = {field.name for field in collection.schema.fields}
+            partition_keys = {field.name for field in collection.schema.fields if field.is_partition_key}
+            if not {"content_hash", "doc_id", "passage"} <= field_names or partition_keys != {"category"}:
+                print("Схема коллекции устарела, коллекция будет пересоздана")
+            elif collection.description != self.collection_description():
+                print("Профиль эмбеддингов изменился, коллекция будет пересоздана")
+            else:
+                return collection
+        return self.create_qa_collection()
+
+    def find_duplicates(self, records):
+        """Повторяющиеся и почти повторяющиеся ответы корпуса за один потоковый проход"""
+        duplicates = DuplicateIndex.build(records, self.dedup_threshold)
+        if duplicates.enabled:
+            stats = duplicates.stats()
+            print(
+                f"Повторы: {stats['aliases']} из {stats['records']} записей свёрнуты в канонические "
+                f"({stats['reduction']:.1%}), почти повторов с другим ответом: {stats['near_duplicates']}"
+            )
+        return duplicates
+
+    def deduplicate(self, data):
+        """Список записей без повторяющихся ответов: у канонических записей — поле aliases"""
+        data = list(data)
+        return list(self.find_duplicates(data).collapse(data))
+
+    def passage_rows(self, data):
+        return list(iter_passages(data, self.passage_max_chars))
+
+    def document_texts(self, data):
+        """Тексты фрагментов записей для энкодера, по одному на строку коллекции"""
+        return [passage_text(row["question"], row["passage"]) for row in self.passage_rows(data)]
+
+    def encode_documents(self, data):
+        """
+        Эмбеддинги фрагментов записей в размерности профиля (сырые векторы модели берутся из дискового кэша).
+        Порядок совпадает с passage_rows(data).
+        """
+        raw = self.embedding_store.encode(self.embedding_model, self.document_texts(data))
+        if self.embedding_profile.needs_fit:
+            self.embedding_profile.fit(raw)
+        return self.embedding_profile.project(raw)
+
+    def fit_embedding_profile(self, records, max_samples=20000):
+        """Обучает проекцию профиля (PCA) до создания коллекции, чтобы отпечаток профиля был окончательным"""
+        if not self.embedding_profile.needs_fit:
+            return
+        sample = list(itertools.islice(iter(records), max_samples))
+        raw = self.embedding_store.encode(self.embedding_model, self.document_texts(sample))
+        self.embedding_profile.fit(raw)
+
+    def insert_qa_data(self, collection, data, upsert=False, flush=True, embeddings=None):
+        """Вставляет записи по одной строке на фрагмент ответа; embeddings — результат encode_documents(data)"""
+        passages = self.passage_rows(data)
+        ids = [row["id"] for row in passages]
+        doc_ids = [row["doc_id"] for row in passages]
+        texts = [row["passage"] for row in passages]
+        questions = [row["question"] for row in passages]
+        answers = [row["answer"] for row in passages]
+        urls = [row["url"] for row in passages]
+        categories = [row["category"] for row in passages]
+        hashes = [record_hash(row) for row in passages]
+        if embeddings is None:
+            embeddings = self.encode_documents(data)
+        rows = [
             ids,
-            embeddings,
+            doc_ids,
+            self.embedding_profile.to_storage(embeddings),
+            texts,
             questions,
             answers,
             urls,
             categories,
-        ])
+            hashes,
+        ]
+        if upsert:
+            collection.upsert(rows)
+        else:
+            collection.insert(rows)
+        if flush:
+            collection.flush()
+
+    def fetch_content_hashes(self, collection, batch_size=1000):
+        """
+        Читает из коллекции без загрузки векторов id записи -> (content_hash, id её фрагментов)
+        """
+        if collection.num_entities == 0:
+            return {}
+        # query работает только по загруженной коллекции с индексом
+        self.create_index(collection)
+        iterator = collection.query_iterator(
+            batch_size=batch_size,
+            expr="id >= 0",
+            output_fields=["doc_id", "content_hash"]
+        )
+        documents = {}
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                for row in batch:
+                    _, passage_ids = documents.setdefault(row["doc_id"], (row["content_hash"], []))
+                    passage_ids.append(row["id"])
+        finally:
+            iterator.close()
+        return documents
+
+    def sync_qa_data(self, collection, data, batch_size=256):
+        """
+        Инкрементально синхронизирует коллекцию с набором данных:
+        перекодируются и вставляются только новые и изменённые записи,
+        удалённые из набора записи удаляются, индекс не пересоздаётся.
+        Фрагменты изменённой записи удаляются и вставляются заново: их число могло измениться.
+        """
+        local_hashes = {doc["id"]: record_hash(doc) for doc in data}
+        remote_documents = self.fetch_content_hashes(collection)
+        remote_hashes = {doc_id: content_hash for doc_id, (content_hash, _) in remote_documents.items()}
+
+        changed = [doc for doc in data if remote_hashes.get(doc["id"]) != local_hashes[doc["id"]]]
+        removed = [doc_id for doc_id in remote_hashes if doc_id not in local_hashes]
+        stats = {
+            "added": sum(1 for doc in changed if doc["id"] not in remote_hashes),
+            "updated": sum(1 for doc in changed if doc["id"] in remote_hashes),
+            "deleted": len(removed),
+            "unchanged": len(data) - len(changed),
+        }
+
+        if not changed and not removed:
+            print(f"Коллекция актуальна, изменений нет ({len(data)} записей)")
+            self.update_lexical_index(data)
+            self.update_token_store(data)
+            self.update_category_router(data)
+            return stats
+
+        stale = [
+            passage_id
+            for doc_id in removed + [doc["id"] for doc in changed if doc["id"] in remote_hashes]
+            for passage_id in remote_documents[doc_id][1]
+        ]
+        for i in range(0, len(stale), batch_size):
+            collection.delete(f"id in {stale[i:i + batch_size]}")
+        for i in tqdm(range(0, len(changed), batch_size), desc="Обновление данных"):
+            self.insert_qa_data(collection, changed[i:i + batch_size], flush=False)
         collection.flush()
+        self.update_lexical_index(data)
+        self.update_token_store(data)
+        self.update_category_router(data)
+
+        print(
+            f"Синхронизация завершена: добавлено {stats['added']}, обновлено {stats['updated']}, "
+            f"удалено {stats['deleted']}, без изменений {stats['unchanged']}"
+        )
+        return stats
 
     def create_index(self, collection):
-    print("Создание индекса HNSW...")
-    index_params = {
-        "metric_type": "COSINE",  # Лучше для текстовых данных
-        "index_type": "HNSW",
-        "params": {
-            "M": 32,               # Увеличили с 16 до 32 для лучшей точности
-            "efConstruction": 500  # Увеличили с 256 до 500 для лучшего качества индекса
-        }
-    }
-    collection.create_index("vector", index_params)
-    collection.load()
+        index_params = self.embedding_profile.index_params()
+        if collection.has_index():
+            if same_index(collection.index().params, index_params):
+                collection.load()
+                return
+            # Параметры подобраны заново (tune_index.py) — индекс перестраивается по уже загруженным векторам
+            print("Параметры индекса изменились, индекс будет пересоздан")
+            collection.release()
+            collection.drop_index()
+        print(f"Создание индекса {index_params['index_type']}...")
+        collection.create_index("vector", index_params)
+        collection.load()
+
+    @metrics.timed("query_encode")
+    def embed_query(self, query):
+        # В кэше хранится сырой вектор модели, проекция профиля применяется после
+        raw = self.query_cache.get_or_encode(
+            query,
+            lambda text: self.encode_queries([f"Вопрос: {text}"])[0]
+        )
+        return self.embedding_profile.project(raw)
+
+    @metrics.timed("query_encode")
+    def embed_queries(self, queries):
+        """Эмбеддинги нескольких запросов: промахи кэша кодируются одним батчем"""
+        raw = self.query_cache.get_many_or_encode(
+            queries,
+            lambda texts: self.encode_queries([f"Вопрос: {text}" for text in texts])
+        )
+        return list(self.embedding_profile.project(np.stack(raw))) if raw else []
 
+    def search_qa(self, query, k=5, query_embedding=None):
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        return self.search_qa_batch([query_embedding], k)[0]
 
-    def search_qa(self, query, k=5):
-        query_embedding = self.embedding_model.encode([f"Вопрос: {query}"]).tolist()
-        collection = Collection(self.qa_collection_name)
-        search_params = {"metric_type": "COSINE", "params": {"ef": 128}}
+    def search_qa_batch(self, query_embeddings, k=5):
+        """
+        Один запрос к коллекции сразу по нескольким векторам.
+        При SEARCH_ROUTING=category запросы с уверенно определёнными категориями ищутся только в их разделах,
+        а если там нашлось меньше k записей — по всей коллекции.
+        """
+        routes = self.route_queries(query_embeddings)
+        groups = {}
+        for i, route in enumerate(routes):
+            groups.setdefault(route, []).append(i)
+
+        results = [None] * len(query_embeddings)
+        for route, indices in groups.items():
+            expr = None if route is None else f"category in {json.dumps(list(route), ensure_ascii=False)}"
+            found = self._search_collection([query_embeddings[i] for i in indices], k, expr)
+            for i, hits in zip(indices, found):
+                results[i] = hits
+
+        fallback = [i for i, route in enumerate(routes) if route is not None and len(results[i]) < k]
+        if fallback:
+            for i, hits in zip(fallback, self._search_collection([query_embeddings[i] for i in fallback], k)):
+                results[i] = hits
+        if self.search_routing == "category":
+            routed = sum(route is not None for route in routes)
+            self.routing_stats["routed"] += routed - len(fallback)
+            self.routing_stats["fallback"] += len(fallback)
+            self.routing_stats["full"] += len(routes) - routed
+        return results
+
+    def route_queries(self, query_embeddings):
+        """Категории для каждого запроса или None — искать по всей коллекции"""
+        if self.search_routing == "none" or self.category_router is None:
+            return [None for _ in query_embeddings]
+        if self.search_routing != "category":
+            raise ValueError(f"Неизвестный SEARCH_ROUTING: {self.search_routing}")
+        return self.category_router.route(
+            query_embeddings, margin=self.routing_margin, max_categories=self.routing_max_categories
+        )
+
+    @metrics.timed("vector_search")
+    def _search_collection(self, query_embeddings, k, expr=None):
+        collection = self.vector_backend.get_collection(self.qa_collection_name)
+        limit = k * self.passage_overfetch
+        search_params = self.embedding_profile.search_params(limit)
         results = collection.search(
-            data=[query_embedding[0]],
+            data=self.embedding_profile.to_storage(np.asarray(query_embeddings, dtype=np.float32)),
             anns_field="vector",
             param=search_params,
-            limit=k,
-            output_fields=["question", "answer", "url", "category"]
+            limit=limit,
+            expr=expr,
+            output_fields=["doc_id", "passage", "question", "answer", "url", "category"]
         )
-        return results[0]
+        return [self.collapse_passages(hits, k) for hits in results]
 
-    def calculate_similarity(self, query, results):
-        query_texts = [query] * len(results)
-        result_texts = [hit.entity.question + ' ' + hit.entity.answer for hit in results]
+    def collapse_passages(self, hits, k=5):
+        """
+        Найденные фрагменты -> записи: у записи остаётся близость лучшего фрагмента
+        и список её найденных фрагментов в порядке близости
+        """
+        documents = {}
+        for hit in hits:
+            doc_id = hit.entity.get("doc_id")
+            if doc_id not in documents:
+                if len(documents) == k:
+                    continue
+                documents[doc_id] = QAHit(doc_id, hit.distance, {
+                    **{field: hit.entity.get(field) for field in ("question", "answer", "url", "category")},
+                    "passages": [],
+                })
+            documents[doc_id].entity.passages.append(hit.entity.get("passage"))
+        return list(documents.values())
+
+    @metrics.timed("sparse_search")
+    def sparse_search(self, query, k=5):
+        if self.lexical_index is None:
+            return []
+        return self.lexical_index.search(query, k)
+
+    @metrics.timed("sparse_search")
+    def sparse_search_batch(self, queries, k=5):
+        if self.lexical_index is None:
+            return [[] for _ in queries]
+        return self.lexical_index.search_batch(queries, k)
+
+    def fuse_results(self, result_lists, weights, k=5):
+        """Reciprocal rank fusion: score(d) = sum(w / (rrf_k + rank)) по всем спискам"""
+        fused_scores = {}
+        hits_by_id = {}
+        for results, weight in zip(result_lists, weights):
+            for rank, hit in enumerate(results, start=1):
+                fused_scores[hit.id] = fused_scores.get(hit.id, 0.0) + weight / (self.hybrid_rrf_k + rank)
+                # Плотный список идёт первым, поэтому у общих документов остаётся hit из Milvus
+                hits_by_id.setdefault(hit.id, hit)
+        ranked = sorted(fused_scores, key=fused_scores.get, reverse=True)
+        return [hits_by_id[doc_id] for doc_id in ranked[:k]]
+
+    def hybrid_search(self, query, k=5, query_embedding=None):
+        """Плотный и лексический поиск выполняются параллельно, результаты сливаются через RRF"""
+        candidates = max(k, self.hybrid_candidates)
+        dense_future = self.retrieval_executor.submit(self.search_qa, query, candidates, query_embedding)
+        sparse_future = self.retrieval_executor.submit(self.sparse_search, query, candidates)
+        dense_results = list(dense_future.result())
+        sparse_results = sparse_future.result()
+        return self.fuse_results(
+            [dense_results, sparse_results],
+            [self.hybrid_dense_weight, self.hybrid_sparse_weight],
+            k
+        )
+
+    def retrieve(self, query, k=5, query_embedding=None):
+        if self.retrieval_mode == "hybrid":
+            return self.hybrid_search(query, k, query_embedding)
+        return self.search_qa(query, k, query_embedding)
+
+    def retrieve_batch(self, queries, k=5, query_embeddings=None):
+        """
+        retrieve для нескольких запросов: плотный поиск — одним запросом к коллекции по всем векторам,
+        BM25 — одним произведением матрицы запросов на матрицу корпуса (параллельно с плотным)
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
+        if self.retrieval_mode != "hybrid":
+            return self.search_qa_batch(query_embeddings, k)
+        candidates = max(k, self.hybrid_candidates)
+        sparse_future = self.retrieval_executor.submit(self.sparse_search_batch, queries, candidates)
+        dense_results = self.search_qa_batch(query_embeddings, candidates)
+        return [
+            self.fuse_results(
+                [list(dense), sparse],
+                [self.hybrid_dense_weight, self.hybrid_sparse_weight],
+                k
+            )
+            for dense, sparse in zip(dense_results, sparse_future.result())
+        ]
+
+    def update_lexical_index(self, records):
+        """Перестраивает и сохраняет лексический индекс корпуса, если корпус изменился"""
+        if isinstance(records, list):
+            fingerprint = corpus_fingerprint(record_hash(doc) for doc in records)
+            if self.lexical_index is not None and self.lexical_index.fingerprint == fingerprint:
+                return self.lexical_index
+
+        hashes = []
+
+        def hashed(records):
+            for doc in records:
+                hashes.append(record_hash(doc))
+                yield doc
+
+        print("Построение лексического индекса BM25...")
+        lexical_index = LexicalIndex.build(hashed(records))
+        lexical_index.fingerprint = corpus_fingerprint(hashes)
+        lexical_index.save(self.lexical_index_path)
+        self.lexical_index = lexical_index
+        self._lexical_index_mtime = self._lexical_index_file_mtime()
+        return lexical_index
+
+    def update_token_store(self, records):
+        """Токенизирует QA-токенизатором новые фрагменты корпуса и удаляет токены исчезнувших"""
+        self.token_store.update(
+            self.qa_tokenizer,
+            (qa_context(row["question"], row["passage"]) for row in iter_passages(records, self.passage_max_chars))
+        )
 
-        tfidf_matrix = self.vectorizer.fit_transform(query_texts + result_texts)
-        query_vectors = tfidf_matrix[:len(results)]
-        result_vectors = tfidf_matrix[len(results):]
+    def update_category_router(self, records, batch_size=1024):
+        """
+        Пересчитывает центроиды категорий по эмбеддингам фрагментов (векторы берутся из дискового кэша),
+        если корпус или профиль эмбеддингов изменились
+        """
+        corpus = self.lexical_index.fingerprint if self.lexical_index is not None else None
+        fingerprint = f"{corpus}:{self.embedding_profile.signature}"
+        if corpus is not None and self.category_router is not None and self.category_router.fingerprint == fingerprint:
+            return self.category_router
+
+        def batches():
+            passages = iter_passages(records, self.passage_max_chars)
+            while True:
+                batch = list(itertools.islice(passages, batch_size))
+                if not batch:
+                    return
+                raw = self.embedding_store.encode(
+                    self.embedding_model, [passage_text(row["question"], row["passage"]) for row in batch]
+                )
+                yield [row["category"] for row in batch], self.embedding_profile.project(raw)
+
+        category_router = CategoryRouter.build(batches(), fingerprint=fingerprint)
+        category_router.save(self.category_router_path)
+        self.category_router = category_router
+        print(f"Маршрутизатор категорий: {len(category_router.categories)} категорий")
+        return category_router
+
+    def _lexical_index_file_mtime(self):
+        try:
+            return os.stat(self.lexical_index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def corpus_version(self):
+        """
+        Версия корпуса — отпечаток последней загрузки данных.
+        Если данные перезагружены другим процессом (init_milvus.py), индекс перечитывается с диска.
+        """
+        mtime = self._lexical_index_file_mtime()
+        if mtime != self._lexical_index_mtime:
+            self.lexical_index = LexicalIndex.load(self.lexical_index_path)
+            self._lexical_index_mtime = mtime
+            self.category_router = CategoryRouter.load(self.category_router_path)
+        return self.lexical_index.fingerprint if self.lexical_index is not None else None
+
+    @metrics.timed("lexical_scoring")
+    def calculate_similarity(self, query, results):
+        ids = [hit.id for hit in results]
 
-        similarities = cosine_similarity(query_vectors, result_vectors).diagonal()
-        print(f"Similarities: {similarities}")
+        lexical_index = self.lexical_index
+        if lexical_index is None:
+            # Индекс корпуса ещё не построен — оцениваем по самим найденным документам
+            lexical_index = LexicalIndex.build(
+                {"id": hit.id, "question": hit.entity.question, "answer": hit.entity.answer} for hit in results
+            )
+        # Документы корпуса оцениваются по частотам из индекса, тексты нужны только для отсутствующих в нём
+        result_texts = None
+        if any(doc_id not in lexical_index.row_by_id for doc_id in ids):
+            result_texts = [hit.entity.question + ' ' + hit.entity.answer for hit in results]
+        similarities = lexical_index.score(query, ids, texts=result_texts)
+        logger.debug("Оценки BM25: %s", similarities)
 
         scored_results = sorted(
             zip(results, similarities),
@@ -114,66 +621,69 @@ class MilvusClient:
         return [result for result, score in scored_results if score > 0.0]
 
     def filter_relevant_results(self, query, results):
-        query_lower = query.lower()
         relevant_results = []
 
         filtered_results = self.calculate_similarity(query, results)
-        print(f"Filtered by similarity: {len(filtered_results)}")
-
-        for hit in filtered_results:
-            question = hit.entity.question.lower()
-            answer = hit.entity.answer.lower()
-
-            if any(word in answer for word in query_lower.split() if len(word) > 3):
-                relevant_results.append(hit)
-
-        print(f"Relevant results: {len(relevant_results)}")
+        logger.debug("После оценки BM25: %d", len(filtered_results))
+
+        with metrics.span("filtering"):
+            # Слова запроса разбираются один раз и ищутся одним скомпилированным выражением; как и прежде,
+            # учитываются все слова длиннее трёх букв, стоп-слова здесь не отбрасываются
+            pattern = matcher.keyword_pattern(matcher.match(query).words)
+            for hit in filtered_results:
+                # Ответы корпуса в нижнем регистре хранятся в лексическом индексе
+                answer = self.lexical_index.lowered_answer(hit.id) if self.lexical_index is not None else None
+                if answer is None:
+                    answer = hit.entity.answer.lower()
+
+                if pattern is not None and pattern.search(answer):
+                    relevant_results.append(hit)
+
+        logger.debug("Релевантных результатов: %d", len(relevant_results))
+        if self.dedup_threshold > 0:
+            # Записи с одинаковыми ответами дали бы QA-модели один и тот же контекст несколько раз
+            relevant_results = unique_hits(relevant_results)
         return relevant_results if relevant_results else filtered_results[:1]
 
     def generate_answer(self, query, context):
         """
-        Генерирует ответ с использованием Chain-of-Thought (CoT) через extractive QA
+        Генерирует ответ через extractive QA по фрагментам контекста
         """
-        # Определяем тип вопроса
-        question_type = self.prompt_manager.classify_query(query)
+        return self.generate_answers([query], [context])[0]
 
-        # Генерируем промт с CoT как инструкцию для extractive QA
-        cot_instruction = self.prompt_manager.generate_prompt(
-            question_type=question_type,
-            context=context,
-            query=query
-        )
-
-        # Улучшаем контекст с инструкциями
-        enhanced_context = f"""
-        [ИНСТРУКЦИЯ]
-        {cot_instruction}
-        Найди в тексте ниже точный ответ на вопрос: "{query}".
-        Если точного ответа нет, верни наиболее релевантный фрагмент.
-
-        [КОНТЕКСТ]
-        {context}
-        [КОНЕЦ КОНТЕКСТА]
+    def generate_answers(self, queries, contexts):
         """
+        Extractive QA для нескольких запросов: contexts[i] — фрагменты из build_context.
+        Окна всех фрагментов всех запросов идут через модель общими батчами, CoT-инструкция
+        в модель не подаётся, чтобы весь бюджет токенов окна уходил на текст фрагмента.
+        """
+        params = {
+            "max_length": self.qa_max_length,
+            "stride": self.qa_stride,
+            "batch_size": self.qa_batch_size,
+            "max_answer_tokens": self.qa_max_answer_tokens,
+        }
+        if self.inference_pool is not None:
+            spans = self.inference_pool.extract_best_spans(queries, contexts, **params)
+        else:
+            spans = extract_best_spans(
+                self.qa_tokenizer, self.qa_model, queries, contexts, token_store=self.token_store, **params
+            )
 
-        # Используем модель для extractive QA
-        inputs = self.qa_tokenizer(
-            query,
-            enhanced_context,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512
-        )
+        return [
+            self._finalize_answer(
+                query, context, matcher.match(query).question_type, self._confident_span(candidates)
+            )
+            for query, context, candidates in zip(queries, contexts, spans)
+        ]
 
-        with torch.no_grad():
-            outputs = self.qa_model(**inputs)
-
-        answer_start = torch.argmax(outputs.start_logits)
-        answer_end = torch.argmax(outputs.end_logits) + 1
-        extracted_answer = self.qa_tokenizer.convert_tokens_to_string(
-            self.qa_tokenizer.convert_ids_to_tokens(inputs.input_ids[0][answer_start:answer_end])
-        )
+    def _confident_span(self, candidates):
+        """Лучший ответ модели или пустая строка, если уверенность ниже QA_MIN_CONFIDENCE"""
+        if not candidates or candidates[0]["confidence"] < self.qa_min_confidence:
+            return ""
+        return candidates[0]["text"]
 
+    def _finalize_answer(self, query, context, question_type, extracted_answer):
         # Если ответ пустой или слишком короткий, используем fallback
         if not extracted_answer.strip() or len(extracted_answer.strip()) < 10:
             extracted_answer = self._generate_fallback_answer(query, context)
@@ -184,11 +694,12 @@ class MilvusClient:
 
         return extracted_answer
 
+    @metrics.timed("fallback")
     def _generate_fallback_answer(self, query, context):
         """Генерирует резервный ответ на основе типа вопроса"""
-        query_lower = query.lower()
+        query_match = matcher.match(query)
 
-        if any(word in query_lower for word in ['записаться', 'прием', 'регистратура']):
+        if query_match.has("fallback_appointment"):
             return (
                 "Записаться на прием к врачу можно несколькими способами:\n\n"
                 "1. Через сайт клиники\n"
@@ -197,7 +708,7 @@ class MilvusClient:
                 "4. Лично в регистратуре\n\n"
                 "Для записи потребуется паспорт и полис ОМС."
             )
-        elif any(word in query_lower for word in ['документ', 'справка', 'полис']):
+        elif query_match.has("fallback_documents"):
             return (
                 "Для медицинских процедур обычно требуются:\n"
                 "- Паспорт\n"
@@ -214,9 +725,124 @@ class MilvusClient:
 
 
 
-    def search_and_generate(self, query, k=5):
-        results = self.search_qa(query, k)
+    @metrics.timed("context_build")
+    def build_context(self, hits):
+        """
+        Фрагменты для QA-модели: найденные фрагменты записи, а для записей
+        из лексического поиска — все фрагменты её ответа
+        """
+        contexts = [
+            qa_context(hit.entity.question, passage)
+            for hit in hits
+            for passage in (hit.entity.get("passages") or split_passages(hit.entity.answer, self.passage_max_chars))
+        ]
+        if self.dedup_threshold > 0:
+            contexts = unique_texts(contexts)
+        return contexts
+
+    def retrieve_context(self, query, k=5, query_embedding=None, results=None):
+        """Поиск (если результаты не переданы), фильтрация и сборка контекста для QA-модели"""
+        if results is None:
+            results = self.retrieve(query, k, query_embedding)
         filtered_results = self.filter_relevant_results(query, results)
-        context = "\n".join([f"Вопрос: {hit.entity.question}\nОтвет: {hit.entity.answer}" for hit in filtered_results])
+        return filtered_results, self.build_context(filtered_results)
+
+    # Общие шаги ответа для search_and_generate, search_and_generate_batch и BatchingInferenceServer:
+    # каждый шаг сам учитывает свой путь ответа в статистике быстрого пути FAQ
+
+    def exact_answer(self, query, started):
+        """Вопрос, дословно совпадающий с вопросом из базы, обходит энкодер, поиск и QA-модель; иначе None"""
+        exact = self.faq.exact(query, self.lexical_index)
+        if exact is None:
+            return None
+        return self.faq.serve("exact", exact, started)
+
+    def cached_answer(self, query_embedding, corpus_version, k, started):
+        """Перефразированный повтор уже отвеченного вопроса обходит поиск и QA-модель; иначе None"""
+        cached = self.answer_cache.lookup(query_embedding, corpus_version, k)
+        if cached is not None:
+            self.faq.record("cache", started)
+        return cached
+
+    def similar_answer(self, results, started):
+        """Ответ записи, почти совпадающей с запросом, без фильтрации и QA-модели; иначе None"""
+        similar = self.faq.similar(results)
+        if similar is None:
+            return None
+        return self.faq.serve("similar", similar, started)
+
+    def store_answer(self, query_embedding, answer, hits, corpus_version, k, started=None):
+        """Завершение ответа после поиска: ответ QA-модели (started задан) учитывается, ответ попадает в кэш"""
+        if started is not None:
+            self.faq.record("model", started)
+        self.answer_cache.store(query_embedding, answer, hits, corpus_version, k)
+        return answer, hits
+
+    def search_and_generate(self, query, k=5):
+        with metrics.trace("search_and_generate", query=query, k=k) as trace, metrics.span("request"):
+            answer, hits = self._search_and_generate(query, k)
+            trace.update(output=answer)
+        return answer, hits
+
+    def search_and_generate_batch(self, queries, k=5):
+        """
+        search_and_generate для пачки запросов: эмбеддинги одним батчем, один многовекторный поиск,
+        окна QA всех запросов — общими батчами. Возвращает список (ответ, записи) в порядке запросов.
+        """
+        with metrics.trace("search_and_generate_batch", queries=list(queries), k=k) as trace:
+            answers = self._search_and_generate_batch(queries, k)
+            trace.update(output=[answer for answer, _ in answers])
+        return answers
+
+    def _search_and_generate_batch(self, queries, k):
+        # Задержка каждого запроса пачки в статистике путей ответа считается от начала пачки
+        started = time.perf_counter()
+        corpus_version = self.corpus_version()
+        answers = [self.exact_answer(query, started) for query in queries]
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        if not pending:
+            return answers
+
+        embeddings = dict(zip(pending, self.embed_queries([queries[i] for i in pending])))
+        to_search = []
+        for i in pending:
+            answers[i] = self.cached_answer(embeddings[i], corpus_version, k, started)
+            if answers[i] is None:
+                to_search.append(i)
+
+        found = self.retrieve_batch([queries[i] for i in to_search], k, [embeddings[i] for i in to_search])
+        to_answer = []
+        for i, results in zip(to_search, found):
+            similar = self.similar_answer(results, started)
+            if similar is not None:
+                answers[i] = self.store_answer(embeddings[i], *similar, corpus_version, k)
+            else:
+                to_answer.append((i, *self.retrieve_context(queries[i], k, embeddings[i], results)))
+
+        if to_answer:
+            generated = self.generate_answers(
+                [queries[i] for i, _, _ in to_answer], [context for _, _, context in to_answer]
+            )
+            for (i, hits, _), answer in zip(to_answer, generated):
+                answers[i] = self.store_answer(embeddings[i], answer, hits, corpus_version, k, started)
+        return answers
+
+    def _search_and_generate(self, query, k):
+        started = time.perf_counter()
+        corpus_version = self.corpus_version()
+        exact = self.exact_answer(query, started)
+        if exact is not None:
+            return exact
+
+        query_embedding = self.embed_query(query)
+        cached = self.cached_answer(query_embedding, corpus_version, k, started)
+        if cached is not None:
+            return cached
+
+        results = self.retrieve(query, k, query_embedding)
+        similar = self.similar_answer(results, started)
+        if similar is not None:
+            return self.store_answer(query_embedding, *similar, corpus_version, k)
+        hits, context = self.retrieve_context(query, k, query_embedding, results)
         answer = self.generate_answer(query, context)
-        return answer, filtered_results
+        return self.store_answer(query_embedding, answer, hits, corpus_version, k, started)
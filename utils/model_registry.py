@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import threading
+
+EMBEDDING_MODEL_NAME = 'intfloat/multilingual-e5-large'
+QA_MODEL_NAME = "Den4ikAI/rubert_large_squad_2"
+
+
+def _load_embedding_model(name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def _load_qa_tokenizer(name):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name)
+
+
+def _load_qa_model(name):
+    from transformers import AutoModelForQuestionAnswering
+    model = AutoModelForQuestionAnswering.from_pretrained(name)
+    model.eval()
+    return model
+
+
+def _load_qa_model_int8(name):
+    """Динамическая int8-квантизация линейных слоёв для CPU"""
+    import torch
+    model = _load_qa_model(name)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_qa_model_onnx(name):
+    """Экспорт в ONNX Runtime (один раз, затем из ONNX_CACHE_DIR)"""
+    try:
+        from optimum.onnxruntime import ORTModelForQuestionAnswering
+    except ImportError:
+        raise ImportError("Для QA_BACKEND=onnx установите optimum[onnxruntime]")
+    export_dir = os.path.join(os.getenv("ONNX_CACHE_DIR", "data/onnx"), re.sub(r"[^\w.-]+", "_", name))
+    if os.path.exists(os.path.join(export_dir, "model.onnx")):
+        return ORTModelForQuestionAnswering.from_pretrained(export_dir)
+    model = ORTModelForQuestionAnswering.from_pretrained(name, export=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+class ModelRegistry:
+    """
+    Общий реестр моделей процесса: каждая модель загружается один раз при первом обращении
+    (или заранее в фоновом потоке) и разделяется всеми MilvusClient и сессиями Streamlit.
+    preload() перед fork рабочих процессов оставляет одну резидентную копию весов (copy-on-write).
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.load_times = {}
+
+    def register(self, kind, loader):
+        self._loaders[kind] = loader
+
+    def _model_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, kind, name):
+        key = (kind, name)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        # Параллельные обращения к ещё не загруженной модели ждут одну загрузку
+        with self._model_lock(key):
+            model = self._models.get(key)
+            if model is None:
+                print(f"Загрузка модели {name} ({kind})...")
+                start = time.perf_counter()
+                model = self._loaders[kind](name)
+                self.load_times[key] = time.perf_counter() - start
+                self._models[key] = model
+        return model
+
+    def is_loaded(self, kind, name):
+        return (kind, name) in self._models
+
+    def preload(self, models):
+        """Синхронно загружает модели, models — список пар (kind, name)"""
+        for kind, name in models:
+            self.get(kind, name)
+
+    def warm_up(self, models):
+        """Загружает модели в фоновом потоке; обращения к ним дождутся окончания загрузки"""
+        thread = threading.Thread(target=self.preload, args=(list(models),), name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+
+registry = ModelRegistry()
+registry.register("embedding", _load_embedding_model)
+registry.register("qa_tokenizer", _load_qa_tokenizer)
+registry.register("qa_model", _load_qa_model)
+registry.register("qa_model_int8", _load_qa_model_int8)
+registry.register("qa_model_onnx", _load_qa_model_onnx)
+
+# QA_BACKEND -> вид модели в реестре
+QA_BACKENDS = {
+    "torch": "qa_model",
+    "int8": "qa_model_int8",
+    "onnx": "qa_model_onnx",
+}
+
+
+def get_embedding_model(name=EMBEDDING_MODEL_NAME):
+    return registry.get("embedding", name)
+
+
+def get_qa_tokenizer(name=QA_MODEL_NAME):
+    return registry.get("qa_tokenizer", name)
+
+
+def qa_model_kind(backend="torch"):
+    if backend not in QA_BACKENDS:
+        raise ValueError(f"Неизвестный QA_BACKEND: {backend}")
+    return QA_BACKENDS[backend]
+
+
+def get_qa_model(name=QA_MODEL_NAME, backend="torch"):
+    return registry.get(qa_model_kind(backend), name)
+
+
+def default_models():
+    return [
+        ("embedding", EMBEDDING_MODEL_NAME),
+        ("qa_tokenizer", QA_MODEL_NAME),
+        (qa_model_kind(os.getenv("QA_BACKEND", "torch")), QA_MODEL_NAME),
+    ]
+
+
+def preload_models(models=None):
+    """Загрузка весов в родительском процессе до fork рабочих процессов"""
+    registry.preload(models or default_models())
+
+
+def start_model_loading(models=None):
+    """
+    MODEL_LOADING=background (по умолчанию) — загрузка в фоновом потоке,
+    lazy — при первом обращении, eager — сразу и синхронно
+    """
+    mode = os.getenv("MODEL_LOADING", "background")
+    models = models or default_models()
+    if mode == "eager":
+        registry.preload(models)
+    elif mode == "background":
+        registry.warm_up(models)
+    elif mode != "lazy":
+        raise ValueError(f"Неизвестный MODEL_LOADING: {mode}")
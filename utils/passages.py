@@ -0,0 +1,66 @@
+import re
+
+# Идентификатор фрагмента: id записи * PASSAGE_ID_STRIDE + номер фрагмента
+PASSAGE_ID_STRIDE = 1000
+
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def _split_long(sentence, max_chars):
+    """Предложение длиннее max_chars режется по словам"""
+    chunk = []
+    length = 0
+    for word in sentence.split():
+        if chunk and length + len(word) + 1 > max_chars:
+            yield " ".join(chunk)
+            chunk, length = [], 0
+        chunk.append(word)
+        length += len(word) + 1
+    if chunk:
+        yield " ".join(chunk)
+
+
+def split_passages(text, max_chars=800):
+    """
+    Делит ответ на фрагменты не длиннее max_chars по границам предложений.
+    Короткий ответ остаётся одним фрагментом, совпадающим с исходным текстом.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text]
+    passages = []
+    current = ""
+    for sentence in SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        for piece in (_split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence]):
+            if current and len(current) + len(piece) + 1 > max_chars:
+                passages.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages[:PASSAGE_ID_STRIDE]
+
+
+def passage_id(doc_id, index):
+    return doc_id * PASSAGE_ID_STRIDE + index
+
+
+def passage_text(question, passage):
+    """Текст фрагмента для энкодера: тот же формат, что и у целой записи"""
+    return f"Вопрос: {question} Ответ: {passage}"
+
+
+def qa_context(question, passage):
+    """Контекст фрагмента для QA-модели"""
+    return f"Вопрос: {question}\nОтвет: {passage}"
+
+
+def iter_passages(records, max_chars=800):
+    """Записи -> строки коллекции по одной на фрагмент ответа"""
+    for doc in records:
+        for index, passage in enumerate(split_passages(doc["answer"], max_chars)):
+            yield {**doc, "id": passage_id(doc["id"], index), "doc_id": doc["id"], "passage": passage}
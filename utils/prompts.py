@@ -1,4 +1,5 @@
 from langchain.prompts import PromptTemplate
+from utils.query_matcher import matcher
 
 class MedicalPromptManager:
     """
@@ -92,32 +93,18 @@ class MedicalPromptManager:
 
     def classify_query(self, query):
         """Определяет тип вопроса для выбора подходящего промта"""
-        query_lower = query.lower()
-
-        if any(word in query_lower for word in ['записаться', 'запись', 'прием', 'приём', 'врач', 'специалист']):
-            return 'appointment'
-        elif any(word in query_lower for word in ['документ', 'справка', 'полис', 'паспорт', 'снилс']):
-            return 'documents'
-        elif any(word in query_lower for word in ['анализ', 'тест', 'исследование', 'диабет', 'глюкоза', 'кровь', 'моча']):
-            return 'tests'
-        elif any(word in query_lower for word in ['подготовка', 'подготовиться', 'как подготовиться']):
-            return 'preparation'
-        else:
-            return 'general'
+        return matcher.match(query).question_type
 
     def extract_keywords(self, query):
         """Извлекает ключевые слова из запроса"""
-        stop_words = {'как', 'что', 'где', 'когда', 'нужно', 'можно', 'надо', 'нужны', 'какие', 'какой'}
-        words = [word.strip("?,!.") for word in query.lower().split()]
-        return [word for word in words if word not in stop_words and len(word) > 3]
+        return list(matcher.match(query).keywords)
 
     def extract_relevant_context(self, query_keywords, context):
         """Извлекает релевантные части контекста"""
         relevant_lines = []
-        for line in context.split('\\n'):
-            line_lower = line.lower()
-            if any(keyword in line_lower for keyword in query_keywords):
-                relevant_lines.append(f"- {line}")
+        pattern = matcher.keyword_pattern(query_keywords)
+        if pattern is not None:
+            relevant_lines = [f"- {line}" for line in context.split('\\n') if pattern.search(line.lower())]
 
         if not relevant_lines:
             return ["Релевантная информация в контексте не найдена."]
@@ -0,0 +1,120 @@
+import numpy as np
+from utils.span_decoder import decode_spans
+from utils.token_store import TokenStore
+from utils.metrics import metrics
+
+
+def build_windows(tokenizer, question_ids, context_ids, max_length=384, stride=128):
+    """
+    Окна модели из готовых id вопроса и контекста, как при return_overflowing_tokens:
+    контекст режется на куски, которые помещаются в max_length вместе с вопросом, с перекрытием stride.
+    Возвращает список (input_ids, token_type_ids, позиция контекста в окне, начало куска в контексте, длина куска).
+    """
+    # Позиция контекста определяется по служебной разметке токенизатора (для BERT: [CLS] q [SEP] c [SEP])
+    context_position = tokenizer.build_inputs_with_special_tokens(list(question_ids), [-1]).index(-1)
+    budget = max_length - len(question_ids) - tokenizer.num_special_tokens_to_add(pair=True)
+    if budget <= 0:
+        raise ValueError(f"Вопрос из {len(question_ids)} токенов не оставляет места для контекста в окне {max_length}")
+    step = max(budget - stride, 1)
+
+    windows = []
+    for window_start in range(0, max(len(context_ids), 1), step):
+        chunk = list(context_ids[window_start:window_start + budget])
+        windows.append((
+            tokenizer.build_inputs_with_special_tokens(list(question_ids), chunk),
+            tokenizer.create_token_type_ids_from_sequences(list(question_ids), chunk),
+            context_position,
+            window_start,
+            len(chunk),
+        ))
+        if window_start + budget >= len(context_ids):
+            break
+    return windows
+
+
+def _pad_batch(tokenizer, windows):
+    """Паддинг окон батча до самого длинного и маска токенов контекста"""
+    length = max(len(input_ids) for input_ids, *_ in windows)
+    input_ids = np.full((len(windows), length), tokenizer.pad_token_id or 0, dtype=np.int64)
+    token_type_ids = np.zeros((len(windows), length), dtype=np.int64)
+    attention_mask = np.zeros((len(windows), length), dtype=np.int64)
+    context_mask = np.zeros((len(windows), length), dtype=bool)
+    for row, (ids, types, context_position, _, chunk_length) in enumerate(windows):
+        input_ids[row, :len(ids)] = ids
+        token_type_ids[row, :len(types)] = types
+        attention_mask[row, :len(ids)] = 1
+        context_mask[row, context_position:context_position + chunk_length] = True
+    return input_ids, token_type_ids, attention_mask, context_mask
+
+
+def extract_best_spans(tokenizer, model, questions, contexts, max_length=384, stride=128,
+                       batch_size=16, max_answer_tokens=64, top_n=1, token_store=None, max_question_tokens=64):
+    """
+    Extractive QA по фрагментам: каждый контекст режется на окна max_length токенов с перекрытием stride,
+    все окна всех вопросов проходят через модель батчами по batch_size,
+    для каждого вопроса отбираются top_n лучших по start+end логитам ответов среди всех его окон.
+    contexts[i] — список фрагментов для questions[i]. Ответ вырезается из текста фрагмента по offsets.
+    Токены фрагментов берутся из token_store (посчитаны при загрузке), на запрос токенизируются только вопросы.
+    Возвращает для каждого вопроса список {"text", "score", "confidence"} по убыванию score,
+    confidence — вероятность ответа среди всех допустимых ответов его окна.
+    """
+    import torch
+
+    pairs = [(i, context) for i, question_contexts in enumerate(contexts) for context in question_contexts]
+    candidates = [{} for _ in questions]
+    if not pairs:
+        return [[] for _ in questions]
+
+    with metrics.span("qa_tokenize"):
+        question_ids = [
+            ids[:max_question_tokens]
+            for ids in tokenizer(list(questions), add_special_tokens=False)["input_ids"]
+        ]
+        context_texts = [context for _, context in pairs]
+        if token_store is not None:
+            context_tokens = token_store.get_many(tokenizer, context_texts)
+        else:
+            context_tokens = TokenStore.tokenize(tokenizer, context_texts)
+
+        windows = []
+        for pair_index, ((question_index, _), (ids, _)) in enumerate(zip(pairs, context_tokens)):
+            for window in build_windows(tokenizer, question_ids[question_index], ids, max_length, stride):
+                windows.append((pair_index, window))
+
+    use_token_types = "token_type_ids" in tokenizer.model_input_names
+    for batch_start in range(0, len(windows), batch_size):
+        batch = windows[batch_start:batch_start + batch_size]
+        input_ids, token_type_ids, attention_mask, context_mask = _pad_batch(tokenizer, [w for _, w in batch])
+        model_inputs = {"input_ids": torch.from_numpy(input_ids), "attention_mask": torch.from_numpy(attention_mask)}
+        if use_token_types:
+            model_inputs["token_type_ids"] = torch.from_numpy(token_type_ids)
+        with metrics.span("qa_forward"), torch.no_grad():
+            outputs = model(**model_inputs)
+        scores, probabilities, starts, ends = decode_spans(
+            outputs.start_logits,
+            outputs.end_logits,
+            context_mask,
+            max_answer_tokens=max_answer_tokens,
+            top_n=top_n
+        )
+
+        for row, (pair_index, (_, _, context_position, window_start, _)) in enumerate(batch):
+            question_index, context = pairs[pair_index]
+            offsets = context_tokens[pair_index][1]
+            for score, probability, start, end in zip(scores[row], probabilities[row], starts[row], ends[row]):
+                if not np.isfinite(score):
+                    break
+                first = offsets[window_start + start - context_position]
+                last = offsets[window_start + end - context_position]
+                text = context[first[0]:last[1]]
+                # Перекрывающиеся окна находят один и тот же ответ — остаётся лучшая оценка
+                known = candidates[question_index].get(text)
+                if known is None or score > known["score"]:
+                    candidates[question_index][text] = {
+                        "text": text, "score": float(score), "confidence": float(probability)
+                    }
+
+    return [
+        sorted(spans.values(), key=lambda span: span["score"], reverse=True)[:top_n]
+        for spans in candidates
+    ]
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils.tokenization import normalize_text
+
+
+class QueryEmbeddingCache:
+    """
+    LRU-кэш эмбеддингов запросов по нормализованному тексту запроса.
+    Необязательный дисковый уровень (SQLite) переживает перезапуски:
+    промах в памяти сначала проверяется на диске и только потом уходит в модель.
+    """
+
+    def __init__(self, model_name, max_size=1024, path=None):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(query):
+        return normalize_text(query)
+
+    def _remember(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, query):
+        key = self.key(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                    (self.model_name, key)
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, query, vector):
+        key = self.key(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                    (self.model_name, key, vector.tobytes())
+                )
+                self._db.commit()
+
+    def get_or_encode(self, query, encode):
+        """Возвращает эмбеддинг из кэша или вычисляет его через encode(query) и сохраняет"""
+        if self.max_size <= 0 or not self.key(query):
+            return np.asarray(encode(query), dtype=np.float32)
+        vector = self.get(query)
+        if vector is None:
+            vector = np.asarray(encode(query), dtype=np.float32)
+            self.put(query, vector)
+        return vector
+
+    def get_many_or_encode(self, queries, encode_batch):
+        """Пакетный вариант: все промахи кэша передаются в encode_batch(texts) одним вызовом"""
+        vectors = [None] * len(queries)
+        if self.max_size > 0:
+            for i, query in enumerate(queries):
+                if self.key(query):
+                    vectors[i] = self.get(query)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = np.asarray(encode_batch([queries[i] for i in missing]), dtype=np.float32)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+                if self.max_size > 0 and self.key(queries[i]):
+                    self.put(queries[i], vector)
+        return vectors
+
+    def stats(self):
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+        }
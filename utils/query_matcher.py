@@ -0,0 +1,98 @@
+import re
+from functools import lru_cache
+from utils.tokenization import NORMALIZE_RE, stem
+
+# Типы вопросов в порядке приоритета: первый найденный определяет тип, иначе 'general'
+QUESTION_TYPE_TRIGGERS = {
+    "appointment": ["записаться", "запись", "прием", "врач", "специалист"],
+    "documents": ["документ", "справка", "полис", "паспорт", "снилс"],
+    "tests": ["анализ", "тест", "исследование", "диабет", "глюкоза", "кровь", "моча"],
+    "preparation": ["подготовка", "подготовиться"],
+}
+
+# Темы резервного ответа, когда QA-модель не нашла ответа
+FALLBACK_TRIGGERS = {
+    "fallback_appointment": ["записаться", "прием", "регистратура"],
+    "fallback_documents": ["документ", "справка", "полис"],
+}
+
+STOP_WORDS = {"как", "что", "где", "когда", "нужно", "можно", "надо", "нужны", "какие", "какой"}
+MIN_KEYWORD_LENGTH = 4
+
+
+class QueryMatch:
+    """
+    Результат разбора запроса: тип вопроса, ключевые слова (без стоп-слов), все слова запроса
+    не короче MIN_KEYWORD_LENGTH (включая стоп-слова) и найденные слова-триггеры по меткам
+    """
+
+    def __init__(self, question_type, keywords, triggers, words=()):
+        self.question_type = question_type
+        self.keywords = keywords
+        self.triggers = triggers
+        self.words = words
+
+    def has(self, label):
+        return label in self.triggers
+
+    def __repr__(self):
+        return f"QueryMatch(question_type={self.question_type!r}, keywords={self.keywords!r})"
+
+
+class QueryMatcher:
+    """
+    Разбор запроса за один проход: запрос один раз приводится к нижнему регистру и режется на слова
+    скомпилированным выражением, каждое слово сверяется с основами слов-триггеров по хэш-таблице префиксов.
+    Основы получены тем же стеммером, что и в лексическом поиске, поэтому совпадают все формы слова
+    (запись, записи, записаться). Результат для слова запоминается, результат для запроса — тоже.
+    """
+
+    def __init__(self, question_types=None, extra_triggers=None, stop_words=None, cache_size=1024):
+        self.question_types = dict(question_types or QUESTION_TYPE_TRIGGERS)
+        self.stop_words = set(stop_words or STOP_WORDS)
+        triggers = {**self.question_types, **(extra_triggers or FALLBACK_TRIGGERS)}
+
+        # Основа -> метки; длины основ проверяются от длинных к коротким
+        self._labels_by_stem = {}
+        for label, words in triggers.items():
+            for word in words:
+                labels = self._labels_by_stem.setdefault(stem(word.replace("ё", "е")), [])
+                if label not in labels:
+                    labels.append(label)
+        self._stem_lengths = sorted({len(word_stem) for word_stem in self._labels_by_stem}, reverse=True)
+        self._word_labels = lru_cache(maxsize=65536)(self._lookup_word)
+        # Запрос разбирается один раз, повторные обращения разных этапов конвейера берутся из кэша
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+        self._keyword_pattern = lru_cache(maxsize=cache_size)(self._compile_keywords)
+
+    def _lookup_word(self, word):
+        """Метки триггера, основа которого — начало слова, или пустой кортеж"""
+        for length in self._stem_lengths:
+            labels = self._labels_by_stem.get(word[:length])
+            if labels:
+                return tuple(labels)
+        return ()
+
+    def _match(self, query):
+        triggers = {}
+        words = []
+        for word in NORMALIZE_RE.findall(query.lower().replace("ё", "е")):
+            for label in self._word_labels(word):
+                triggers.setdefault(label, []).append(word)
+            if len(word) >= MIN_KEYWORD_LENGTH:
+                words.append(word)
+        keywords = tuple(word for word in words if word not in self.stop_words)
+        question_type = next((label for label in self.question_types if label in triggers), "general")
+        return QueryMatch(question_type, keywords, triggers, tuple(words))
+
+    def keyword_pattern(self, keywords):
+        """Скомпилированный поиск любого из ключевых слов в тексте (None, если слов нет)"""
+        return self._keyword_pattern(tuple(keywords))
+
+    def _compile_keywords(self, keywords):
+        if not keywords:
+            return None
+        return re.compile("|".join(re.escape(word) for word in sorted(set(keywords), key=len, reverse=True)))
+
+
+matcher = QueryMatcher()
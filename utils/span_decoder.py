@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def _as_array(logits):
+    """Логиты torch/ONNX Runtime -> float32 массив NumPy"""
+    if hasattr(logits, "detach"):
+        logits = logits.detach().cpu().numpy()
+    return np.asarray(logits, dtype=np.float32)
+
+
+def _logsumexp(values, axis):
+    peak = np.max(values, axis=axis, keepdims=True)
+    peak = np.where(np.isfinite(peak), peak, 0.0)
+    with np.errstate(divide="ignore"):
+        return np.squeeze(peak, axis=axis) + np.log(np.sum(np.exp(values - peak), axis=axis))
+
+
+def decode_spans(start_logits, end_logits, context_mask, max_answer_tokens=64, top_n=1):
+    """
+    Лучшие ответы для батча окон одной тензорной операцией.
+    Оцениваются все пары (start, end) с start <= end < start + max_answer_tokens,
+    оба конца которых лежат в контексте (context_mask), оценка — start_logit + end_logit.
+    Возвращает массивы (batch, top_n): scores, probabilities (доля по всем допустимым парам окна),
+    starts, ends. У окон, где допустимых пар меньше top_n, лишние места имеют score = -inf.
+    """
+    start_logits = _as_array(start_logits)
+    end_logits = _as_array(end_logits)
+    context_mask = np.asarray(context_mask, dtype=bool)
+    batch, length = start_logits.shape
+
+    positions = np.arange(length)
+    span_length = positions[None, :] - positions[:, None]
+    band = (span_length >= 0) & (span_length < max_answer_tokens)
+    valid = band[None, :, :] & context_mask[:, :, None] & context_mask[:, None, :]
+
+    scores = np.where(valid, start_logits[:, :, None] + end_logits[:, None, :], -np.inf).reshape(batch, -1)
+    top_n = min(top_n, scores.shape[1])
+    top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    with np.errstate(invalid="ignore"):
+        probabilities = np.exp(top_scores - _logsumexp(scores, axis=1)[:, None])
+    probabilities = np.where(np.isfinite(top_scores), probabilities, 0.0)
+    return top_scores, probabilities, top // length, top % length
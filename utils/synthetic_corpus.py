@@ -0,0 +1,224 @@
+import json
+import random
+
+# Категории и темы по образцу data/medical_data.json: для каждой категории —
+# шаблоны вопросов, предметы вопроса, предложения ответа и ключевые слова
+CATEGORIES = {
+    "appointment": {
+        "questions": ["Как записаться на {subject}?", "Можно ли перенести {subject}?", "Как отменить {subject}?"],
+        "subjects": ["прием к терапевту", "прием к врачу", "повторный прием", "консультацию специалиста",
+                     "прием по ДМС", "вечерний прием", "прием в выходной день"],
+        "sentences": [
+            "Записаться можно через сайт клиники, выбрав врача, дату и время приема.",
+            "По телефону регистратуры администратор подберет удобное время.",
+            "В мобильном приложении клиники доступна запись и перенос визита.",
+            "Для записи потребуется полис ОМС или данные страховки по ДМС.",
+            "Отменить запись нужно не позднее чем за сутки до приема.",
+        ],
+        "keywords": ["запись на прием", "регистратура", "полис ОМС", "ДМС", "приложение"],
+    },
+    "diagnostics": {
+        "questions": ["Как подготовиться к {subject}?", "Сколько длится {subject}?", "Где пройти {subject}?"],
+        "subjects": ["УЗИ брюшной полости", "МРТ головного мозга", "КТ грудной клетки", "ЭКГ", "гастроскопию",
+                     "колоноскопию", "рентген позвоночника", "анализ крови на глюкозу", "общий анализ мочи"],
+        "sentences": [
+            "Исследование проводится натощак, последний прием пищи — за 8 часов.",
+            "За три дня до исследования исключите продукты, вызывающие газообразование.",
+            "Возьмите с собой направление врача и результаты предыдущих исследований.",
+            "Результаты передаются лечащему врачу и доступны в личном кабинете.",
+            "Процедура длится от 15 до 40 минут в зависимости от зоны исследования.",
+            "Металлические предметы перед исследованием необходимо снять.",
+        ],
+        "keywords": ["подготовка к исследованию", "натощак", "направление", "результаты анализов"],
+    },
+    "general": {
+        "questions": ["Как получить {subject}?", "Где взять {subject}?", "Какие документы нужны для {subject}?"],
+        "subjects": ["больничный лист", "справку в бассейн", "выписку из медицинской карты", "направление на анализы",
+                     "справку для работы", "копию медицинской карты", "полис ОМС"],
+        "sentences": [
+            "Документ оформляется в регистратуре при предъявлении паспорта и полиса ОМС.",
+            "Электронный больничный лист открывает лечащий врач на приеме.",
+            "Срок подготовки выписки составляет до трех рабочих дней.",
+            "Справку можно получить лично или через законного представителя.",
+            "Заявление подается на имя главного врача клиники.",
+        ],
+        "keywords": ["документы", "паспорт", "полис ОМС", "справка", "регистратура"],
+    },
+    "specialists": {
+        "questions": ["Когда нужно обратиться к {subject}?", "Что лечит {subject}?", "Как попасть к {subject}?"],
+        "subjects": ["кардиологу", "неврологу", "эндокринологу", "офтальмологу", "дерматологу", "урологу",
+                     "лору", "хирургу", "ортопеду"],
+        "sentences": [
+            "Направление к узкому специалисту выдает терапевт после первичного осмотра.",
+            "По ДМС можно записаться к специалисту без направления.",
+            "На прием возьмите результаты анализов и выписки из медицинской карты.",
+            "Обратиться к врачу стоит при повторяющихся симптомах или ухудшении самочувствия.",
+            "Первичная консультация длится около 30 минут.",
+        ],
+        "keywords": ["специалист", "направление", "консультация", "терапевт"],
+    },
+    "vaccination": {
+        "questions": ["Где сделать {subject}?", "Нужна ли {subject}?", "Какие противопоказания у {subject}?"],
+        "subjects": ["прививку от гриппа", "вакцинацию от клещевого энцефалита", "прививку от кори",
+                     "ревакцинацию от дифтерии", "прививку от гепатита B"],
+        "sentences": [
+            "Перед вакцинацией врач проводит осмотр и измеряет температуру.",
+            "Противопоказаниями являются острые заболевания и аллергия на компоненты вакцины.",
+            "После прививки необходимо 30 минут оставаться под наблюдением.",
+            "Сведения о прививке вносятся в сертификат профилактических прививок.",
+        ],
+        "keywords": ["вакцинация", "прививка", "противопоказания", "сертификат"],
+    },
+    "treatment": {
+        "questions": ["Как лечить {subject}?", "Сколько длится лечение {subject}?", "Что делать при {subject}?"],
+        "subjects": ["ОРВИ", "бронхит", "гастрит", "мигрень", "гипертонию", "аллергический ринит", "остеохондроз"],
+        "sentences": [
+            "Лечение назначает врач после осмотра и обследования.",
+            "Самолечение может привести к осложнениям, поэтому важно соблюдать назначения.",
+            "При повышении температуры выше 38,5 градусов обратитесь к врачу.",
+            "Курс лечения обычно составляет от 7 до 14 дней.",
+            "Контрольный прием назначается после завершения курса.",
+        ],
+        "keywords": ["лечение", "назначения врача", "обследование", "симптомы"],
+    },
+    "prenatal": {
+        "questions": ["Когда вставать на учет по {subject}?", "Какие анализы нужны при {subject}?",
+                      "Как проходит {subject}?"],
+        "subjects": ["беременности", "скрининг первого триместра", "ведение беременности", "УЗИ плода"],
+        "sentences": [
+            "Встать на учет рекомендуется до 12 недель беременности.",
+            "Скрининг включает УЗИ и биохимический анализ крови.",
+            "Наблюдение ведет акушер-гинеколог женской консультации.",
+            "График визитов к врачу составляется индивидуально.",
+        ],
+        "keywords": ["беременность", "скрининг", "учет", "акушер-гинеколог"],
+    },
+    "pediatrics": {
+        "questions": ["Как записать ребенка на {subject}?", "Когда проходить {subject}?", "Что нужно для {subject}?"],
+        "subjects": ["прием к педиатру", "диспансеризацию ребенка", "медосмотр перед школой", "справку в детский сад"],
+        "sentences": [
+            "Записать ребенка может один из родителей при наличии полиса ОМС ребенка.",
+            "Профилактические осмотры проводятся по возрастному графику.",
+            "Для справки в детский сад потребуется осмотр педиатра и результаты анализов.",
+            "На прием возьмите свидетельство о рождении и карту прививок.",
+        ],
+        "keywords": ["педиатр", "ребенок", "медосмотр", "детский сад"],
+    },
+    "endocrinology": {
+        "questions": ["Как контролировать {subject}?", "Какие анализы сдать при {subject}?", "Что означает {subject}?"],
+        "subjects": ["сахарный диабет", "уровень глюкозы", "гормоны щитовидной железы", "гликированный гемоглобин"],
+        "sentences": [
+            "Уровень глюкозы измеряют натощак и через два часа после еды.",
+            "Гликированный гемоглобин отражает средний уровень сахара за три месяца.",
+            "Эндокринолог подбирает терапию и диету по результатам анализов.",
+            "Анализы на гормоны сдают утром до 10 часов.",
+        ],
+        "keywords": ["эндокринолог", "диабет", "глюкоза", "гормоны"],
+    },
+    "neurology": {
+        "questions": ["Что делать при {subject}?", "Когда обращаться к неврологу при {subject}?",
+                      "Как лечится {subject}?"],
+        "subjects": ["головной боли", "головокружении", "бессоннице", "онемении рук", "боли в спине"],
+        "sentences": [
+            "Невролог проводит осмотр и при необходимости назначает МРТ.",
+            "Внезапная сильная головная боль требует срочного обращения к врачу.",
+            "Ведите дневник симптомов и возьмите его на прием.",
+            "Лечение включает препараты, физиотерапию и лечебную физкультуру.",
+        ],
+        "keywords": ["невролог", "головная боль", "МРТ", "физиотерапия"],
+    },
+    "gastroenterology": {
+        "questions": ["Что делать при {subject}?", "Какая диета нужна при {subject}?", "Как обследовать {subject}?"],
+        "subjects": ["изжоге", "боли в животе", "гастрите", "язве желудка", "желчном пузыре"],
+        "sentences": [
+            "Гастроэнтеролог назначает гастроскопию и УЗИ брюшной полости.",
+            "Рекомендуется дробное питание небольшими порциями.",
+            "Исключите острую, жирную и жареную пищу.",
+            "При черном стуле или рвоте с кровью вызывайте скорую помощь.",
+        ],
+        "keywords": ["гастроэнтеролог", "диета", "гастроскопия", "желудок"],
+    },
+    "cardiology": {
+        "questions": ["Что делать при {subject}?", "Как проверить {subject}?", "Когда идти к кардиологу при {subject}?"],
+        "subjects": ["повышенном давлении", "боли в груди", "аритмии", "высоком холестерине", "одышке"],
+        "sentences": [
+            "Кардиолог назначает ЭКГ, суточное мониторирование и УЗИ сердца.",
+            "Давление измеряют дважды в день и записывают в дневник.",
+            "Боль в груди дольше 15 минут — повод вызвать скорую помощь.",
+            "Снизить риск помогают отказ от курения и регулярная физическая активность.",
+        ],
+        "keywords": ["кардиолог", "давление", "ЭКГ", "сердце"],
+    },
+    "gynecology": {
+        "questions": ["Как подготовиться к {subject}?", "Как часто проходить {subject}?", "Где сделать {subject}?"],
+        "subjects": ["осмотру гинеколога", "мазок на цитологию", "УЗИ органов малого таза", "кольпоскопию"],
+        "sentences": [
+            "Профилактический осмотр гинеколога рекомендуется раз в год.",
+            "Исследование проводится в первой половине цикла.",
+            "За два дня до визита исключите лекарственные свечи и спринцевания.",
+            "Результаты мазка готовы через 5–7 рабочих дней.",
+        ],
+        "keywords": ["гинеколог", "осмотр", "цитология", "УЗИ"],
+    },
+}
+
+BRANCHES = ["в центральном филиале", "в филиале на Лесной", "в детском отделении", "в дневном стационаре",
+            "в консультативном центре", "в филиале на Садовой"]
+
+PARAPHRASES = ["Подскажите, {q}", "{q} Заранее спасибо.", "Скажите пожалуйста, {q}", "{q}"]
+
+
+def generate_record(rng, doc_id, category):
+    """Запись корпуса: вопрос по шаблону категории и ответ из нескольких предложений темы"""
+    spec = CATEGORIES[category]
+    subject = rng.choice(spec["subjects"])
+    question = rng.choice(spec["questions"]).format(subject=subject)
+    # Уточнение филиала делает вопросы большого корпуса различимыми
+    if rng.random() < 0.7:
+        question = f"{question[:-1]} {rng.choice(BRANCHES)} №{rng.randint(1, 40)}?"
+    sentences = rng.sample(spec["sentences"], k=rng.randint(2, len(spec["sentences"])))
+    answer = f"{subject[0].upper()}{subject[1:]}: " + " ".join(sentences)
+    answer += " Ключевые слова: " + ", ".join(rng.sample(spec["keywords"], k=min(3, len(spec["keywords"])))) + "."
+    return {
+        "id": doc_id,
+        "question": question,
+        "answer": answer,
+        "url": f"clinic/{category}/{doc_id}",
+        "category": category,
+    }
+
+
+def generate_corpus(size, seed=0):
+    """Генератор size записей по 13 категориям с id от 1; одинаковый seed даёт одинаковый корпус"""
+    rng = random.Random(seed)
+    categories = list(CATEGORIES)
+    for doc_id in range(1, size + 1):
+        yield generate_record(rng, doc_id, rng.choice(categories))
+
+
+def write_corpus(file_path, size, seed=0):
+    """Сохраняет корпус в JSONL (формат, который читает iter_records)"""
+    with open(file_path, "w", encoding="utf-8") as file:
+        for record in generate_corpus(size, seed):
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return file_path
+
+
+def generate_queries(records, count, seed=0, paraphrase_rate=0.5, unseen_rate=0.2):
+    """
+    Запросы к корпусу: вопросы записей, часть перефразирована, часть (unseen_rate)
+    сгенерирована заново и может не иметь точного ответа в корпусе
+    """
+    rng = random.Random(seed)
+    categories = list(CATEGORIES)
+    queries = []
+    for _ in range(count):
+        if rng.random() < unseen_rate:
+            question = generate_record(rng, 0, rng.choice(categories))["question"]
+        else:
+            question = rng.choice(records)["question"]
+        if rng.random() < paraphrase_rate:
+            template = rng.choice(PARAPHRASES)
+            question = template.format(q=question[0].lower() + question[1:] if template[0] != "{" else question)
+        queries.append(question)
+    return queries
@@ -0,0 +1,78 @@
+import os
+import re
+import pickle
+import hashlib
+import threading
+import numpy as np
+
+
+class TokenStore:
+    """
+    Токены QA-токенизатора для фрагментов корпуса, посчитанные при загрузке данных.
+    Для каждого текста фрагмента хранятся id токенов без служебных токенов и их offsets в тексте,
+    так что на запрос токенизируется только сам вопрос, а окна модели собираются из готовых массивов.
+    Тексты, которых нет в хранилище, токенизируются на лету и запоминаются в памяти.
+    """
+
+    def __init__(self, tokenizer_name, root="data/tokens"):
+        self.tokenizer_name = tokenizer_name
+        self.path = os.path.join(root, re.sub(r"[^\w.-]+", "_", tokenizer_name), "tokens.pkl")
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                self.entries = pickle.load(file)
+
+    def key(self, text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def tokenize(tokenizer, texts):
+        """Тексты -> пары (ids int32, offsets int32 [n, 2])"""
+        encoded = tokenizer(list(texts), add_special_tokens=False, return_offsets_mapping=True)
+        return [
+            (np.asarray(ids, dtype=np.int32), np.asarray(offsets, dtype=np.int32).reshape(-1, 2))
+            for ids, offsets in zip(encoded["input_ids"], encoded["offset_mapping"])
+        ]
+
+    def get_many(self, tokenizer, texts):
+        """Токены для каждого текста; отсутствующие в хранилище токенизируются одним вызовом"""
+        keys = [self.key(text) for text in texts]
+        missing = {key: text for key, text in zip(keys, texts) if key not in self.entries}
+        if missing:
+            tokenized = self.tokenize(tokenizer, missing.values())
+            with self._lock:
+                self.entries.update(zip(missing, tokenized))
+        return [self.entries[key] for key in keys]
+
+    def update(self, tokenizer, texts, batch_size=256):
+        """
+        Приводит хранилище к набору текстов корпуса: токенизирует новые, удаляет исчезнувшие
+        и сохраняет файл, если что-то изменилось
+        """
+        texts = {self.key(text): text for text in texts}
+        missing = [key for key in texts if key not in self.entries]
+        stale = [key for key in self.entries if key not in texts]
+        if not missing and not stale:
+            return
+        entries = {key: entry for key, entry in self.entries.items() if key in texts}
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            entries.update(zip(batch, self.tokenize(tokenizer, [texts[key] for key in batch])))
+        with self._lock:
+            self.entries = entries
+        self.save()
+        print(f"Токены фрагментов: добавлено {len(missing)}, удалено {len(stale)}, всего {len(entries)}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(self.entries, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,39 @@
+import re
+
+WORD_RE = re.compile(r"\w\w+")
+NORMALIZE_RE = re.compile(r"\w+")
+
+# Возвратная частица отрезается первой, затем самое длинное подходящее окончание
+REFLEXIVE_ENDINGS = ("ся",)
+ENDINGS = tuple(sorted((
+    # прилагательные и причастия
+    "ого", "его", "ому", "ему", "ими", "ыми", "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ую", "юю",
+    # глаголы
+    "ать", "ять", "ить", "еть", "уть", "ешь", "ете", "ет", "ют", "ут", "ит", "ат", "ят", "ла", "ло", "ли",
+    # существительные
+    "ами", "ями", "ах", "ях", "ов", "ев", "ей", "ам", "ям", "ом", "ем", "ию", "ия",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+), key=len, reverse=True))
+MIN_STEM_LENGTH = 4
+
+
+def normalize_text(text):
+    """Нормализация для сравнения строк: нижний регистр, ё -> е, схлопнутые пробелы и без пунктуации"""
+    return " ".join(NORMALIZE_RE.findall(text.lower().replace("ё", "е")))
+
+
+def stem(word):
+    """Облегчённый стеммер для русского языка: отрезает окончание, оставляя не меньше 4 символов основы"""
+    for ending in REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            word = word[:-len(ending)]
+            break
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Токены для лексического поиска: слова от 2 символов в нижнем регистре, приведённые к основе"""
+    return [stem(word) for word in WORD_RE.findall(text.lower().replace("ё", "е"))]
@@ -0,0 +1,459 @@
+import os
+import re
+import json
+import numpy as np
+from pymilvus import connections, Collection, CollectionSchema, utility
+from utils.hits import QAHit
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+class MilvusBackend:
+    """Хранилище векторов в Milvus (etcd + minio + standalone из docker-compose)"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._collections = {}
+
+    def connect(self):
+        print("Подключение к Milvus...")
+        connections.connect("default", host=self.host, port=self.port)
+
+    def has_collection(self, name):
+        return utility.has_collection(name)
+
+    def drop_collection(self, name):
+        self._collections.pop(name, None)
+        if utility.has_collection(name):
+            utility.drop_collection(name)
+
+    def create_collection(self, name, fields, description=""):
+        schema = CollectionSchema(fields, description=description)
+        collection = Collection(name, schema)
+        self._collections[name] = collection
+        return collection
+
+    def get_collection(self, name):
+        # Collection(name) делает RPC describe, поэтому объект коллекции кэшируется
+        if name not in self._collections:
+            self._collections[name] = Collection(name)
+        return self._collections[name]
+
+
+class LocalBackend:
+    """
+    Локальное хранилище векторов в процессе: точный поиск матричным умножением NumPy
+    для небольших корпусов и FAISS HNSW для больших. Данные сохраняются на диск.
+    """
+
+    def __init__(self, root="data/vector_store"):
+        self.root = root
+        self._collections = {}
+
+    def connect(self):
+        print(f"Локальное хранилище векторов: {self.root}")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def has_collection(self, name):
+        return os.path.exists(os.path.join(self._path(name), "schema.json"))
+
+    def drop_collection(self, name):
+        self._collections.pop(name, None)
+        path = self._path(name)
+        if os.path.isdir(path):
+            for file_name in os.listdir(path):
+                os.remove(os.path.join(path, file_name))
+            os.rmdir(path)
+
+    def create_collection(self, name, fields, description=""):
+        self.drop_collection(name)
+        collection = LocalCollection(self._path(name), fields=fields, description=description)
+        collection.flush()
+        self._collections[name] = collection
+        return collection
+
+    def get_collection(self, name):
+        if name not in self._collections:
+            if not self.has_collection(name):
+                raise ValueError(f"Коллекция '{name}' не найдена в {self.root}")
+            self._collections[name] = LocalCollection(self._path(name))
+        return self._collections[name]
+
+
+def create_vector_backend(host, port):
+    """VECTOR_BACKEND=milvus (по умолчанию) или local"""
+    backend = os.getenv("VECTOR_BACKEND", "milvus")
+    if backend == "local":
+        return LocalBackend(os.getenv("LOCAL_STORE_DIR", "data/vector_store"))
+    if backend == "milvus":
+        return MilvusBackend(host, port)
+    raise ValueError(f"Неизвестный VECTOR_BACKEND: {backend}")
+
+
+class LocalField:
+    def __init__(self, name, dtype, is_primary=False, params=None, is_partition_key=False):
+        self.name = name
+        self.dtype = dtype
+        self.is_primary = is_primary
+        self.params = params or {}
+        self.is_partition_key = is_partition_key
+
+
+class LocalSchema:
+    def __init__(self, fields, description=""):
+        self.fields = fields
+        self.description = description
+
+
+class LocalIndex:
+    def __init__(self, params):
+        self.params = params
+
+
+class LocalQueryIterator:
+    def __init__(self, rows, batch_size):
+        self._rows = rows
+        self._batch_size = batch_size
+        self._offset = 0
+
+    def next(self):
+        batch = self._rows[self._offset:self._offset + self._batch_size]
+        self._offset += self._batch_size
+        return batch
+
+    def close(self):
+        self._rows = []
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class LocalCollection:
+    """
+    Коллекция в памяти процесса с подмножеством API pymilvus.Collection,
+    которое использует MilvusClient: insert/upsert/delete/flush/query_iterator/search.
+    Метрика — косинусная близость (векторы нормируются при вставке), как COSINE в Milvus.
+    Векторы хранятся в float32, в float16 для поля FLOAT16_VECTOR и в int8 после индекса IVF_SQ8.
+    """
+
+    def __init__(self, path, fields=None, description=""):
+        self.path = path
+        self.faiss_min_size = int(os.getenv("LOCAL_FAISS_MIN_SIZE", "20000"))
+        self._pending = []
+        self._faiss_index = None
+        self._dirty_index = True
+        if fields is not None:
+            self.schema = LocalSchema(
+                [
+                    LocalField(f.name, f.dtype.name, f.is_primary, dict(f.params), bool(f.is_partition_key))
+                    for f in fields
+                ],
+                description
+            )
+            self.index_params = None
+            self._init_storage()
+        else:
+            self._load()
+
+    def _init_storage(self):
+        self.primary_field = next(f.name for f in self.schema.fields if f.is_primary)
+        self.vector_field = next(f.name for f in self.schema.fields if f.dtype.endswith("VECTOR"))
+        self.dim = int(next(f.params["dim"] for f in self.schema.fields if f.name == self.vector_field))
+        self.scalar_fields = [
+            f.name for f in self.schema.fields if f.name not in (self.primary_field, self.vector_field)
+        ]
+        # Ключ разделов: строки каждого значения собираются в отдельный «раздел» для поиска с фильтром
+        self.partition_key = next((f.name for f in self.schema.fields if f.is_partition_key), None)
+        self._partitions = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, self.dim), dtype=self._storage_dtype)
+        self._fields = {name: [] for name in self.scalar_fields}
+        self._row_by_id = {}
+
+    @property
+    def _storage_dtype(self):
+        if self.index_params and self.index_params.get("index_type") == "IVF_SQ8":
+            return np.int8
+        vector_dtype = next(f.dtype for f in self.schema.fields if f.name == self.vector_field)
+        return np.float16 if vector_dtype == "FLOAT16_VECTOR" else np.float32
+
+    def _encode_vectors(self, vectors):
+        """Нормированные float32 векторы -> формат хранения"""
+        if self._storage_dtype == np.int8:
+            # Масштаб на вектор: косинус от него не зависит, а все 8 бит идут на значащие компоненты
+            scale = 127 / np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12)
+            return np.clip(np.round(vectors * scale), -127, 127).astype(np.int8)
+        return vectors.astype(self._storage_dtype)
+
+    def _decode_vectors(self, vectors):
+        if vectors.dtype == np.int8:
+            return _normalize(vectors.astype(np.float32))
+        return vectors.astype(np.float32)
+
+    @property
+    def description(self):
+        return self.schema.description
+
+    @property
+    def field_names(self):
+        return [f.name for f in self.schema.fields]
+
+    def _load(self):
+        with open(os.path.join(self.path, "schema.json"), "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        self.schema = LocalSchema(
+            [
+                LocalField(f["name"], f["dtype"], f["is_primary"], f["params"], f.get("is_partition_key", False))
+                for f in meta["fields"]
+            ],
+            meta["description"]
+        )
+        self.index_params = meta["index_params"]
+        self._init_storage()
+        if meta["num_entities"]:
+            self._ids = np.load(os.path.join(self.path, "ids.npy"))
+            self._vectors = np.load(os.path.join(self.path, "vectors.npy"))
+            with open(os.path.join(self.path, "fields.json"), "r", encoding="utf-8") as file:
+                self._fields = json.load(file)
+            self._row_by_id = {int(doc_id): row for row, doc_id in enumerate(self._ids)}
+
+    # --- запись ---
+
+    def insert(self, data, partition_name=None):
+        self._pending.append(data)
+
+    def upsert(self, data, partition_name=None):
+        self._pending.append(data)
+
+    def _consolidate(self):
+        """Применяет накопленные вставки: существующие id перезаписываются, новые дописываются"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        new_ids, new_vectors = [], []
+        new_fields = {name: [] for name in self.scalar_fields}
+        for data in pending:
+            columns = dict(zip(self.field_names, data))
+            vectors = self._encode_vectors(_normalize(columns[self.vector_field]))
+            for i, doc_id in enumerate(columns[self.primary_field]):
+                doc_id = int(doc_id)
+                row = self._row_by_id.get(doc_id)
+                if row is not None and row >= len(self._ids):
+                    # Повтор id внутри ещё не применённых вставок
+                    new_vectors[row - len(self._ids)] = vectors[i]
+                    for name in self.scalar_fields:
+                        new_fields[name][row - len(self._ids)] = columns[name][i]
+                    continue
+                if row is not None:
+                    self._vectors[row] = vectors[i]
+                    for name in self.scalar_fields:
+                        self._fields[name][row] = columns[name][i]
+                    continue
+                self._row_by_id[doc_id] = len(self._ids) + len(new_ids)
+                new_ids.append(doc_id)
+                new_vectors.append(vectors[i])
+                for name in self.scalar_fields:
+                    new_fields[name].append(columns[name][i])
+        if new_ids:
+            self._ids = np.concatenate([self._ids, np.asarray(new_ids, dtype=np.int64)])
+            self._vectors = np.concatenate([self._vectors, np.stack(new_vectors)])
+            for name in self.scalar_fields:
+                self._fields[name].extend(new_fields[name])
+        self._dirty_index = True
+        self._partitions = None
+
+    def delete(self, expr, partition_name=None):
+        self._consolidate()
+        ids = self._parse_expr(expr)
+        if ids is None:
+            keep = np.zeros(len(self._ids), dtype=bool)
+        else:
+            keep = ~np.isin(self._ids, np.fromiter(ids, dtype=np.int64))
+        self._ids = self._ids[keep]
+        self._vectors = self._vectors[keep]
+        rows = np.flatnonzero(keep)
+        self._fields = {name: [values[row] for row in rows] for name, values in self._fields.items()}
+        self._row_by_id = {int(doc_id): row for row, doc_id in enumerate(self._ids)}
+        self._dirty_index = True
+        self._partitions = None
+
+    def flush(self):
+        self._consolidate()
+        os.makedirs(self.path, exist_ok=True)
+        self._atomic_save("ids.npy", lambda file: np.save(file, self._ids))
+        self._atomic_save("vectors.npy", lambda file: np.save(file, self._vectors))
+        self._atomic_save("fields.json", lambda file: file.write(
+            json.dumps(self._fields, ensure_ascii=False).encode("utf-8")
+        ))
+        meta = {
+            "fields": [vars(f) for f in self.schema.fields],
+            "description": self.schema.description,
+            "index_params": self.index_params,
+            "num_entities": len(self._ids),
+        }
+        self._atomic_save("schema.json", lambda file: file.write(
+            json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        ))
+
+    def _atomic_save(self, file_name, write):
+        path = os.path.join(self.path, file_name)
+        with open(f"{path}.tmp", "wb") as file:
+            write(file)
+        os.replace(f"{path}.tmp", path)
+
+    @property
+    def num_entities(self):
+        self._consolidate()
+        return len(self._ids)
+
+    # --- индекс ---
+
+    def has_index(self):
+        return self.index_params is not None
+
+    def create_index(self, field_name, index_params):
+        self._consolidate()
+        vectors = self._decode_vectors(self._vectors)
+        self.index_params = index_params
+        self._vectors = self._encode_vectors(vectors)
+        self._dirty_index = True
+        self.flush()
+
+    def index(self):
+        return LocalIndex(self.index_params)
+
+    def drop_index(self):
+        self._consolidate()
+        vectors = self._decode_vectors(self._vectors)
+        self.index_params = None
+        self._vectors = self._encode_vectors(vectors)
+        self._faiss_index = None
+        self._dirty_index = True
+        self.flush()
+
+    def load(self):
+        self._consolidate()
+
+    def release(self):
+        pass
+
+    def _get_faiss_index(self):
+        """FAISS HNSW строится лениво и только для больших коллекций, иначе точный поиск"""
+        if faiss is None or len(self._ids) < self.faiss_min_size:
+            return None
+        if not self.index_params or self.index_params.get("index_type") != "HNSW":
+            return None
+        if self._dirty_index or self._faiss_index is None:
+            params = self.index_params.get("params", {})
+            index = faiss.IndexHNSWFlat(self.dim, int(params.get("M", 32)), faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = int(params.get("efConstruction", 200))
+            index.add(self._decode_vectors(self._vectors))
+            self._faiss_index = index
+            self._dirty_index = False
+        return self._faiss_index
+
+    # --- чтение ---
+
+    def _parse_expr(self, expr):
+        """
+        Поддерживаются выражения вида 'id in [1, 2]' и 'id >= 0' (все записи),
+        для поиска и query — ещё фильтр по ключу разделов (см. _partition_rows)
+        """
+        if not expr:
+            return None
+        match = re.fullmatch(rf"\s*{self.primary_field}\s+in\s+\[([\d,\s-]*)\]\s*", expr)
+        if match:
+            return {int(value) for value in match.group(1).split(",") if value.strip()}
+        if re.fullmatch(rf"\s*{self.primary_field}\s*>=\s*0\s*", expr):
+            return None
+        raise ValueError(f"Выражение не поддерживается локальным хранилищем: {expr}")
+
+    def _partition_rows(self, expr):
+        """Строки разделов для выражений вида 'category in ["a", "b"]' по ключу разделов, иначе None"""
+        if not expr or self.partition_key is None:
+            return None
+        match = re.fullmatch(rf"\s*{self.partition_key}\s+in\s+(\[.*\])\s*", expr)
+        if not match:
+            return None
+        if self._partitions is None:
+            partitions = {}
+            for row, value in enumerate(self._fields[self.partition_key]):
+                partitions.setdefault(value, []).append(row)
+            self._partitions = {value: np.asarray(rows, dtype=np.int64) for value, rows in partitions.items()}
+        rows = [self._partitions[value] for value in json.loads(match.group(1)) if value in self._partitions]
+        return np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+
+    def _rows_for_expr(self, expr):
+        rows = self._partition_rows(expr)
+        if rows is not None:
+            return rows
+        ids = self._parse_expr(expr)
+        if ids is None:
+            return np.arange(len(self._ids))
+        return np.asarray(sorted(self._row_by_id[doc_id] for doc_id in ids if doc_id in self._row_by_id), dtype=np.int64)
+
+    def _row_fields(self, row, output_fields):
+        return {name: self._fields[name][row] for name in output_fields or []}
+
+    def query(self, expr, output_fields=None, limit=None):
+        self._consolidate()
+        rows = self._rows_for_expr(expr)[:limit]
+        return [
+            {self.primary_field: int(self._ids[row]), **self._row_fields(row, output_fields)}
+            for row in rows
+        ]
+
+    def query_iterator(self, batch_size=1000, expr=None, output_fields=None):
+        return LocalQueryIterator(self.query(expr, output_fields), batch_size)
+
+    def _scores(self, queries, candidates, block_size=65536):
+        """Косинусная близость блоками, чтобы не распаковывать все float16/int8 векторы разом"""
+        if self._vectors.dtype == np.float32:
+            return queries @ self._vectors[candidates].T
+        scores = np.empty((len(queries), len(candidates)), dtype=np.float32)
+        for start in range(0, len(candidates), block_size):
+            block = self._decode_vectors(self._vectors[candidates[start:start + block_size]])
+            scores[:, start:start + block_size] = queries @ block.T
+        return scores
+
+    def search(self, data, anns_field, param, limit, output_fields=None, expr=None, **kwargs):
+        self._consolidate()
+        queries = _normalize(data)
+        if not len(self._ids):
+            return [[] for _ in queries]
+
+        index = self._get_faiss_index() if not expr else None
+        if index is not None:
+            index.hnsw.efSearch = max(int(param.get("params", {}).get("ef", 64)), limit)
+            scores, rows = index.search(queries, limit)
+        else:
+            candidates = self._rows_for_expr(expr)
+            if not len(candidates):
+                return [[] for _ in queries]
+            all_scores = self._scores(queries, candidates)
+            top = min(limit, len(candidates))
+            part = np.argpartition(-all_scores, top - 1, axis=1)[:, :top]
+            part_scores = np.take_along_axis(all_scores, part, axis=1)
+            order = np.argsort(-part_scores, axis=1, kind="stable")
+            rows = candidates[np.take_along_axis(part, order, axis=1)]
+            scores = np.take_along_axis(part_scores, order, axis=1)
+
+        return [
+            [
+                QAHit(int(self._ids[row]), float(score), self._row_fields(row, output_fields))
+                for row, score in zip(query_rows, query_scores) if row >= 0
+            ]
+            for query_rows, query_scores in zip(rows, scores)
+        ]
@@ -0,0 +1,116 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils.qa_inference import extract_best_spans
+
+# MilvusClient родительского процесса: рабочие процессы получают его (и загруженные веса) при fork
+_client = None
+
+
+def _core_slices(workers, cores):
+    """Делит доступные ядра на workers непересекающихся наборов (при нехватке ядер наборы повторяются)"""
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    size = len(cores) // workers
+    return [cores[i * size:(i + 1) * size] for i in range(workers)]
+
+
+def _init_worker(counter, slices, threads):
+    """Рабочий процесс закрепляется за своим набором ядер, torch использует столько же потоков"""
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, slices[slot % len(slices)])
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _ping():
+    return os.getpid()
+
+
+def _encode(texts):
+    return np.asarray(_client.embedding_model.encode(list(texts)), dtype=np.float32)
+
+
+def _extract_spans(questions, contexts, params):
+    return extract_best_spans(
+        _client.qa_tokenizer, _client.qa_model, questions, contexts, token_store=_client.token_store, **params
+    )
+
+
+def _split(items, parts):
+    """Непустые последовательные куски для параллельной обработки"""
+    parts = max(1, min(parts, len(items)))
+    bounds = np.linspace(0, len(items), parts + 1).astype(int)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+class InferencePool:
+    """
+    Пул процессов для энкодера и QA-модели: каждый из workers процессов закреплён за своим набором ядер
+    и выполняет прямые проходы с threads_per_worker потоками torch, задания идут через общую очередь.
+    Веса загружаются в родителе до fork и разделяются процессами (copy-on-write), поэтому память
+    под модели не умножается на число процессов. Пул нужно запускать до первого прямого прохода
+    в родителе: OpenMP, инициализированный до fork, может зависнуть в дочерних процессах.
+    """
+
+    def __init__(self, milvus_client, workers=2, threads_per_worker=None):
+        self.milvus_client = milvus_client
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.executor = None
+
+    def start(self):
+        global _client
+        if self.executor is not None:
+            return self
+        # Все веса загружаются до fork
+        self.milvus_client.embedding_model
+        self.milvus_client.qa_tokenizer
+        self.milvus_client.qa_model
+        _client = self.milvus_client
+
+        if hasattr(os, "sched_getaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+        else:
+            cores = list(range(os.cpu_count() or 1))
+        slices = _core_slices(self.workers, cores)
+        threads = self.threads_per_worker or len(slices[0])
+        context = multiprocessing.get_context("fork")
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(context.Value("i", 0), slices, threads)
+        )
+        # При fork все процессы создаются первым заданием — сразу, пока родитель ещё не выполнял прямых проходов
+        self.executor.submit(_ping).result()
+        print(f"Пул вывода: процессов {self.workers}, потоков на процесс {threads}")
+        return self
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def encode(self, texts):
+        """Эмбеддинги текстов; большой список делится между процессами"""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        futures = [self.executor.submit(_encode, texts[start:end]) for start, end in _split(texts, self.workers)]
+        return np.concatenate([future.result() for future in futures])
+
+    def extract_best_spans(self, questions, contexts, **params):
+        """extract_best_spans в рабочих процессах; вопросы пачки делятся между процессами"""
+        futures = [
+            self.executor.submit(_extract_spans, list(questions[start:end]), list(contexts[start:end]), params)
+            for start, end in _split(questions, self.workers)
+        ]
+        return [spans for future in futures for spans in future.result()]
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import random
+import argparse
+import subprocess
+
+# Код, выполняемый в отдельном процессе для каждого числа рабочих процессов
+PROBE = r"""
+import json, sys, time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from utils.milvus_client import MilvusClient
+
+workers, concurrency, requests = int(sys.argv[1]), int(sys.argv[2]), json.load(open(sys.argv[3]))
+client = MilvusClient()
+if workers:
+    client.start_inference_pool(workers)
+else:
+    client.embedding_model, client.qa_tokenizer, client.qa_model
+
+def handle(request):
+    start = time.perf_counter()
+    client.embed_queries([request["query"]])
+    client.generate_answers([request["query"]], [request["contexts"]])
+    return time.perf_counter() - start
+
+handle(requests[0])  # прогрев
+with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    start = time.perf_counter()
+    latencies = list(executor.map(handle, requests))
+    elapsed = time.perf_counter() - start
+client.stop_inference_pool()
+print("REPORT " + json.dumps({
+    "requests": len(requests),
+    "requests_per_s": len(requests) / elapsed,
+    "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+    "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+}))
+"""
+
+
+def build_requests(size, count, contexts_per_query, seed):
+    """Запросы синтетического корпуса бенчмарка и фрагменты их записей как контекст QA"""
+    from utils.passages import split_passages, qa_context
+    from utils.synthetic_corpus import generate_corpus, generate_queries
+    records = list(generate_corpus(size, seed=seed))
+    rng = random.Random(seed)
+    return [
+        {
+            "query": query,
+            "contexts": [
+                qa_context(doc["question"], passage)
+                for doc in rng.sample(records, contexts_per_query)
+                for passage in split_passages(doc["answer"])
+            ],
+        }
+        for query in generate_queries(records, count, seed=seed)
+    ]
+
+
+def run_probe(workers, concurrency, requests_path):
+    # Кэш эмбеддингов запросов отключён, чтобы каждый запрос доходил до энкодера
+    env = dict(os.environ, QUERY_CACHE_SIZE="0", MODEL_LOADING="lazy")
+    env.setdefault("VECTOR_BACKEND", "local")
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, str(workers), str(concurrency), requests_path],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith("REPORT "):
+            return json.loads(line[len("REPORT "):])
+    raise RuntimeError(f"Замер с {workers} процессами завершился с ошибкой:\n{completed.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность вывода: один процесс против пула из 1..N процессов")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов (сессий)")
+    parser.add_argument("--corpus-size", type=int, default=1000, help="Размер синтетического корпуса бенчмарка")
+    parser.add_argument("--contexts", type=int, default=3, help="Записей в контексте QA на запрос")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    requests_path = os.path.abspath("worker_pool_requests.json")
+    with open(requests_path, "w", encoding="utf-8") as file:
+        json.dump(build_requests(args.corpus_size, args.requests, args.contexts, args.seed), file, ensure_ascii=False)
+
+    report = {}
+    try:
+        for workers in range(0, args.max_workers + 1):
+            label = "в процессе" if workers == 0 else f"пул {workers}"
+            print(f"Замер: {label}...")
+            report[workers] = run_probe(workers, args.concurrency, requests_path)
+    finally:
+        os.remove(requests_path)
+
+    base = report[1]["requests_per_s"] if 1 in report else None
+    print(f"\n{'режим':<14}{'запр/с':>10}{'ускорение':>11}{'p50, мс':>10}{'p95, мс':>10}")
+    for workers, row in report.items():
+        label = "в процессе" if workers == 0 else f"пул {workers}"
+        speedup = row["requests_per_s"] / base if base else 0.0
+        row["speedup_vs_1_worker"] = speedup
+        print(f"{label:<14}{row['requests_per_s']:>10.2f}{speedup:>10.2f}x{row['p50_ms']:>10.0f}{row['p95_ms']:>10.0f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({str(workers): row for workers, row in report.items()}, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()